@@ -6,14 +6,30 @@ from algosdk.future.transaction import (AssetConfigTxn, AssetTransferTxn,
                                         PaymentTxn)
 from algosdk.v2client.algod import AlgodClient
 
+from Journal import aJournal
+from Pool import aClientPool
+
 
 class aAsset(AlgodClient):
-    def __init__(self, algod_url: str, txns_fee: int, explorer_tx_url: str):
-        self.algod_client = AlgodClient("", algod_url)
-        self.params = self.algod_client.suggested_params()
-        self.params.flat_fee = True
-        self.params.fee = txns_fee
+    def __init__(self, algod_url: str, txns_fee: int, explorer_tx_url: str, journal: Union[aJournal, None] = None,
+        pool: Union[aClientPool, None] = None):
+        if pool is not None:
+            # shared client and cached params, the url is taken from the pool
+            self.algod_client = pool.algod_client
+            self.params = pool.params(txns_fee)
+        else:
+            self.algod_client = AlgodClient("", algod_url)
+            self.params = self.algod_client.suggested_params()
+            self.params.flat_fee = True
+            self.params.fee = txns_fee
         self.explorer_tx_url = explorer_tx_url
+        self.journal = journal
+
+    def send_group(self, signed_group: list) -> str:
+        """send a signed group, through the journal when one is set so it survives crashes and node timeouts"""
+        if self.journal is not None:
+            return self.journal.submit(self.algod_client, signed_group)
+        return self.algod_client.send_transactions(signed_group)
 
     def to_mainnet(self) -> bool:
         """change client to mainnet"""
@@ -59,7 +75,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
         signed_group = [stxn1, stxn2]
 
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
         transactioninfo = {}
         transactioninfo['txid'] = txid
         transactioninfo['link'] = f"{self.explorer_tx_url}{txid}"
@@ -95,7 +111,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -136,7 +152,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -171,7 +187,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -207,7 +223,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -243,7 +259,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -279,7 +295,7 @@ class aAsset(AlgodClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
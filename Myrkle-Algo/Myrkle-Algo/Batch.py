@@ -0,0 +1,81 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, Union
+
+import msgpack
+from algosdk import encoding
+from algosdk.future.transaction import Transaction, calculate_group_id
+from algosdk.v2client.algod import AlgodClient
+
+
+def canonical_bytes(txn: Transaction) -> bytes:
+    """the canonical msgpack bytes of an unsigned transaction, what external signers sign.
+    packed the way encoding.msgpack_encode does, without its base64 step that would only be decoded again"""
+    return msgpack.packb(encoding._sort_dict(txn.dictify()), use_bin_type=True)
+
+def assign_group(txns: list) -> list:
+    """set the group id of a list of transactions, returns the same list"""
+    if len(txns) > 1:
+        gid = calculate_group_id(txns)
+        for txn in txns:
+            txn.group = gid
+    return txns
+
+def _pack_group(packer: msgpack.Packer, group: list):
+    packer.pack_array_header(len(group))
+    for txn in group:
+        packer.pack(canonical_bytes(txn))
+
+def pack_groups(groups: Iterable[list], out: BinaryIO) -> int:
+    """stream unsigned groups to a binary file, each group as a msgpack array of canonical transaction bytes.
+    returns the number of groups written"""
+    packer = msgpack.Packer(use_bin_type=True, autoreset=False)
+    count = 0
+    for group in groups:
+        _pack_group(packer, group)
+        out.write(packer.bytes())
+        packer.reset()
+        count += 1
+    return count
+
+def iter_batches(groups: Iterable[list], batch_size: int = 256) -> Iterator[memoryview]:
+    """pack unsigned groups into one buffer per batch_size groups, yielded as a view of the packer's buffer without a copy.
+    a view is only valid until the next batch is requested"""
+    packer = msgpack.Packer(use_bin_type=True, autoreset=False)
+    count = 0
+    for group in groups:
+        _pack_group(packer, group)
+        count += 1
+        if count == batch_size:
+            view = packer.getbuffer()
+            yield view
+            view.release()
+            packer.reset()
+            count = 0
+    if count:
+        yield packer.getbuffer()
+
+def unpack_groups(data: Union[bytes, memoryview, BinaryIO]) -> Iterator[list]:
+    """read back groups written by pack_groups or iter_batches, each as a list of transaction bytes"""
+    unpacker = msgpack.Unpacker(data if hasattr(data, "read") else None, raw=False)
+    if not hasattr(data, "read"):
+        unpacker.feed(data)
+    yield from unpacker
+
+def send_signed_groups(algod_client: AlgodClient, signed_groups: Iterable[Union[bytes, list]], workers: int = 8) -> list:
+    """submit signed groups straight from their msgpack bytes, without decoding them into transaction objects.
+    a group is either one blob of concatenated signed transactions or a list of signed transaction blobs.
+    algod takes one group per request, so groups are sent concurrently.
+    returns one result per group in order, its first txid or the exception algod raised for it"""
+    blobs = [group if isinstance(group, (bytes, bytearray, memoryview)) else b"".join(group) for group in signed_groups]
+    if not blobs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(blobs))) as executor:
+        return list(executor.map(lambda blob: _send_raw(algod_client, blob), blobs))
+
+def _send_raw(algod_client: AlgodClient, blob: bytes):
+    # one rejected group must not hide the outcome of the others
+    try:
+        return algod_client.send_raw_transaction(base64.b64encode(blob))
+    except Exception as e:
+        return e
@@ -0,0 +1,202 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable, Union
+
+FILL_TIMEOUT = 10 # seconds other processes wait for a key being filled before filling it themselves
+
+
+class TTLCache:
+    def __init__(self, ttl: Union[float, None] = None, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """return a cached value, or default if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Union[float, None] = None) -> None:
+        """cache a value, ttl overrides the cache default for this entry"""
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.maxsize:
+                # entries keep insertion order, so the first one is the oldest
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (value, expires)
+
+    def get_or_set(self, key: Hashable, fill: Callable[[], Any], ttl: Union[float, None] = None) -> Any:
+        """return a cached value, calling fill to compute and cache it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = fill()
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, key: Hashable) -> None:
+        """drop a cached value"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: tuple) -> None:
+        """drop every value whose tuple key starts with prefix"""
+        with self._lock:
+            for key in [key for key in self._entries if isinstance(key, tuple) and key[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """drop every cached value"""
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCache:
+    """a TTLCache stored in a SQLite file, shared by every process on the machine that opens the same path.
+    values are pickled, so they must come from a trusted source such as the library's own lookups"""
+    def __init__(self, path: str, name: str, ttl: Union[float, None] = None, maxsize: int = 4096):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._sets = 0
+        self._db().execute("""CREATE TABLE IF NOT EXISTS entries (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            expires REAL,
+            stored REAL NOT NULL,
+            PRIMARY KEY (name, key))""")
+        self._db().execute("CREATE INDEX IF NOT EXISTS entries_stored ON entries (name, stored)")
+        self._db().execute("CREATE TABLE IF NOT EXISTS fills (name TEXT NOT NULL, key TEXT NOT NULL, until REAL NOT NULL, PRIMARY KEY (name, key))")
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread, and a fresh one in a forked child since sqlite connections do not survive a fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL") # a cache can lose its last writes on power loss
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """return a cached value, or default if it is missing or expired"""
+        row = self._db().execute("SELECT value FROM entries WHERE name = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+            (self.name, repr(key), time.time())).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key: Hashable, value: Any, ttl: Union[float, None] = None) -> None:
+        """cache a value, ttl overrides the cache default for this entry"""
+        self._db().execute("INSERT OR REPLACE INTO entries (name, key, value, expires, stored) VALUES (?, ?, ?, ?, ?)",
+            self._row(key, value, ttl))
+        self._evict()
+
+    def get_or_set(self, key: Hashable, fill: Callable[[], Any], ttl: Union[float, None] = None) -> Any:
+        """return a cached value, calling fill to compute and cache it on a miss.
+        the first process to miss a key fills it while the others wait for its value, so workers that miss
+        together make one fetch. a filler that takes longer than FILL_TIMEOUT is no longer waited for"""
+        missing = object()
+        value = self.get(key, missing)
+        deadline = time.monotonic() + FILL_TIMEOUT
+        while value is missing:
+            if self._claim(key):
+                try:
+                    value = self.get(key, missing) # filled between the miss and the claim
+                    if value is missing:
+                        value = fill()
+                        self.set(key, value, ttl)
+                finally:
+                    self._release(key)
+            elif time.monotonic() >= deadline:
+                value = fill()
+                self.set(key, value, ttl)
+            else:
+                time.sleep(0.002)
+                value = self.get(key, missing)
+        return value
+
+    def delete(self, key: Hashable) -> None:
+        """drop a cached value"""
+        self._db().execute("DELETE FROM entries WHERE name = ? AND key = ?", (self.name, repr(key)))
+
+    def delete_prefix(self, prefix: tuple) -> None:
+        """drop every value whose tuple key starts with prefix"""
+        # keys are stored as repr, and a longer tuple's repr starts with its prefix's repr up to the closing bracket
+        start = repr(tuple(prefix))[:-1].rstrip(",") + ", "
+        self._db().execute("DELETE FROM entries WHERE name = ? AND (key = ? OR substr(key, 1, ?) = ?)",
+            (self.name, repr(tuple(prefix)), len(start), start))
+
+    def clear(self) -> None:
+        """drop every cached value"""
+        self._db().execute("DELETE FROM entries WHERE name = ?", (self.name,))
+
+    def _claim(self, key: Hashable) -> bool:
+        db = self._db()
+        now = time.time()
+        # a lease left by a filler that crashed expires instead of blocking the key
+        db.execute("DELETE FROM fills WHERE name = ? AND key = ? AND until <= ?", (self.name, repr(key), now))
+        return db.execute("INSERT OR IGNORE INTO fills (name, key, until) VALUES (?, ?, ?)",
+            (self.name, repr(key), now + FILL_TIMEOUT)).rowcount == 1
+
+    def _release(self, key: Hashable):
+        self._db().execute("DELETE FROM fills WHERE name = ? AND key = ?", (self.name, repr(key)))
+
+    def _row(self, key: Hashable, value: Any, ttl: Union[float, None]) -> tuple:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        return (self.name, repr(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), None if ttl is None else now + ttl, now)
+
+    def _evict(self):
+        # counting on every write would cost more than the write, so trim once every 64 writes
+        self._sets += 1
+        if self._sets % 64:
+            return
+        db = self._db()
+        db.execute("DELETE FROM entries WHERE name = ? AND expires <= ?", (self.name, time.time()))
+        excess = db.execute("SELECT COUNT(*) FROM entries WHERE name = ?", (self.name,)).fetchone()[0] - self.maxsize
+        if excess > 0:
+            db.execute("DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries WHERE name = ? ORDER BY stored LIMIT ?)",
+                (self.name, excess))
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_shared_path = None
+_shared_names = None
+
+def named_cache(name: str, ttl: Union[float, None] = None, maxsize: int = 4096) -> Union[TTLCache, SharedCache]:
+    """return the process wide cache registered under name, creating it on first use"""
+    with _caches_lock:
+        if name not in _caches:
+            if _shared_path is not None and (_shared_names is None or name in _shared_names):
+                _caches[name] = SharedCache(_shared_path, name, ttl, maxsize)
+            else:
+                _caches[name] = TTLCache(ttl, maxsize)
+        return _caches[name]
+
+def use_shared_cache(path: Union[str, None], names: Iterable[str] = None) -> bool:
+    """back the named caches with the SQLite file at path, so worker processes share one another's lookups.
+    names limits it to those caches, path None goes back to in-process caches.
+    call it at worker start up, in-process caches already created are dropped"""
+    global _shared_path, _shared_names
+    with _caches_lock:
+        _shared_path = path
+        _shared_names = None if names is None else frozenset(names)
+        _caches.clear()
+    return True
@@ -1,80 +1,157 @@
-from typing import Union
+import copy
+from typing import Iterator, Union
 
 from algosdk import account
-from algosdk.constants import ZERO_ADDRESS
 from algosdk.future.transaction import (AssetCloseOutTxn, AssetDestroyTxn,
                                         AssetFreezeTxn, AssetOptInTxn,
                                         AssetTransferTxn, AssetUpdateTxn,
-                                        PaymentTxn, calculate_group_id,
-                                        transaction)
+                                        PaymentTxn, Transaction,
+                                        calculate_group_id, transaction)
 from algosdk.v2client.algod import AlgodClient
 from algosdk.v2client.indexer import IndexerClient
 
-from Misc import timestamp_to_string
+from a_constants import ASSET_MIN_BALANCE, MAX_GROUP_SIZE, ZERO_ADDRESS
+from Batch import assign_group
+from Fees import MIN_FEE, aFeeEstimator
+from Journal import aJournal
+from Misc import r_block_timestamps, timestamp_to_string
+from Pool import aClientPool
 
 
 class aEng(AlgodClient, IndexerClient):
-    def __init__(self, algod_url: str, indexer_url: str, explorer_tx_url: str, txns_fee: int):
-        self.algod_client = AlgodClient("", algod_url)
-        self.indexer_client = IndexerClient("", indexer_url)
-        self.params = self.algod_client.suggested_params()
-        self.params.flat_fee = True
-        self.params.fee = txns_fee
+    def __init__(self, algod_url: str, indexer_url: str, explorer_tx_url: str, txns_fee: int,
+        journal: Union[aJournal, None] = None, pool: Union[aClientPool, None] = None):
+        if pool is not None:
+            # shared clients and cached params, the urls are taken from the pool
+            self.algod_client = pool.algod_client
+            self.indexer_client = pool.indexer_client
+            self.params = pool.params(txns_fee)
+        else:
+            self.algod_client = AlgodClient("", algod_url)
+            self.indexer_client = IndexerClient("", indexer_url)
+            self.params = self.algod_client.suggested_params()
+            self.params.flat_fee = True
+            self.params.fee = txns_fee
         self.explorer_tx_url = explorer_tx_url
+        self.journal = journal
+
+    def send_group(self, signed_group: list) -> str:
+        """send a signed group, through the journal when one is set so it survives crashes and node timeouts"""
+        if self.journal is not None:
+            return self.journal.submit(self.algod_client, signed_group)
+        return self.algod_client.send_transactions(signed_group)
 
     def modify_fee(self, new_fee: int) -> bool:
         """modify the network fee for faster transaction time"""
-        assert new_fee > 1000
-        self.params.fee = new_fee
+        assert new_fee >= MIN_FEE
+        # swap in a changed copy, threads building transactions never see params change under them
+        params = copy.copy(self.params)
+        params.fee = new_fee
+        self.params = params
         return True
-    
-    def merge_account(self, sender_addr: str, receiver_addr: str, fee_addr: str, fee_amount: int) -> dict:
-        """merge 2 accounts"""
-        return dict(PaymentTxn(sender_addr, self.params, fee_addr, fee_amount, receiver_addr).dictify())
-
-    def delete_account(self, sender_addr: str, fee_addr: str, fee_amount: int) -> dict:
-        """delete account"""
-        return dict(PaymentTxn(sender_addr,self.params, fee_addr, fee_amount, ZERO_ADDRESS).dictify())
-
-    def rekey_account(self, sender_addr: str, receiver_addr: str, fee_addr: str, fee_amount: int) -> dict:
-        """change the private key of the sender address, to the receiver address"""
-        return dict(PaymentTxn(sender=sender_addr, sp=self.params, receiver=fee_addr, amt=fee_amount, rekey_to=receiver_addr).dictify())
 
-    def add_asset(self, sender_addr: str, asset_id: int) -> dict:
-        """enable transacting with an asset"""
-        return dict(AssetOptInTxn(sender=sender_addr, sp=self.params, index=asset_id).dictify())
+    def estimated_fee(self, fee_estimator: aFeeEstimator, target_rounds: int = 1) -> bool:
+        """set the fee the estimator expects to confirm within target_rounds, without a network call"""
+        return self.modify_fee(fee_estimator.fee(target_rounds))
     
-    def remove_asset(self, sender_addr: str, asset_id: int, receiver_addr: int) -> dict:
-        """disable transacting with an asset"""
-        return dict(AssetCloseOutTxn(sender=sender_addr, sp=self.params, receiver=receiver_addr, index=asset_id).dictify())
+    def merge_account(self, sender_addr: str, receiver_addr: str, fee_addr: str, fee_amount: int, as_txn: bool = False) -> Union[dict, Transaction]:
+        """merge 2 accounts, as_txn returns the unsigned transaction"""
+        txn = PaymentTxn(sender_addr, self.params, fee_addr, fee_amount, receiver_addr)
+        return txn if as_txn else dict(txn.dictify())
+
+    def delete_account(self, sender_addr: str, fee_addr: str, fee_amount: int, as_txn: bool = False) -> Union[dict, Transaction]:
+        """delete account, as_txn returns the unsigned transaction"""
+        txn = PaymentTxn(sender_addr,self.params, fee_addr, fee_amount, ZERO_ADDRESS)
+        return txn if as_txn else dict(txn.dictify())
+
+    def rekey_account(self, sender_addr: str, receiver_addr: str, fee_addr: str, fee_amount: int, as_txn: bool = False) -> Union[dict, Transaction]:
+        """change the private key of the sender address, to the receiver address, as_txn returns the unsigned transaction"""
+        txn = PaymentTxn(sender=sender_addr, sp=self.params, receiver=fee_addr, amt=fee_amount, rekey_to=receiver_addr)
+        return txn if as_txn else dict(txn.dictify())
+
+    def add_asset(self, sender_addr: str, asset_id: int, as_txn: bool = False) -> Union[dict, Transaction]:
+        """enable transacting with an asset, as_txn returns the unsigned transaction"""
+        txn = AssetOptInTxn(sender=sender_addr, sp=self.params, index=asset_id)
+        return txn if as_txn else dict(txn.dictify())
+    
+    def remove_asset(self, sender_addr: str, asset_id: int, receiver_addr: int, as_txn: bool = False) -> Union[dict, Transaction]:
+        """disable transacting with an asset, as_txn returns the unsigned transaction"""
+        txn = AssetCloseOutTxn(sender=sender_addr, sp=self.params, receiver=receiver_addr, index=asset_id)
+        return txn if as_txn else dict(txn.dictify())
+
+    def batch_add_assets(self, sender_addr: str, asset_ids: list, group_size: int = MAX_GROUP_SIZE) -> list:
+        """opt in to many assets at once, returns unsigned groups of up to group_size transactions.
+        assets the account already holds are skipped and a ValueError is raised
+        when the balance cannot cover the extra min balance and fees"""
+        info = self.algod_client.account_info(sender_addr)
+        held = {holding["asset-id"] for holding in info.get("assets", [])}
+        txns = [AssetOptInTxn(sender=sender_addr, sp=self.params, index=asset_id)
+            for asset_id in dict.fromkeys(asset_ids) if asset_id not in held]
+        required = len(txns) * ASSET_MIN_BALANCE + sum(txn.fee for txn in txns)
+        self._check_headroom(info, required)
+        return self._grouped(txns, group_size)
+
+    def batch_remove_assets(self, sender_addr: str, asset_ids: list, receiver_addr: str, group_size: int = MAX_GROUP_SIZE) -> list:
+        """opt out of many assets at once, closing any remaining balance to receiver_addr.
+        returns unsigned groups of up to group_size transactions, assets the account does not hold are skipped"""
+        info = self.algod_client.account_info(sender_addr)
+        held = {holding["asset-id"] for holding in info.get("assets", [])}
+        txns = [AssetCloseOutTxn(sender=sender_addr, sp=self.params, receiver=receiver_addr, index=asset_id)
+            for asset_id in dict.fromkeys(asset_ids) if asset_id in held]
+        self._check_headroom(info, sum(txn.fee for txn in txns))
+        return self._grouped(txns, group_size)
+
+    def _check_headroom(self, info: dict, required: int):
+        available = info["amount"] - info.get("min-balance", 0)
+        if required > available:
+            raise ValueError(f"{info['address']} needs {required} microalgos of headroom, has {available}")
+
+    def _grouped(self, txns: list, group_size: int) -> list:
+        if not 0 < group_size <= MAX_GROUP_SIZE:
+            raise ValueError(f"group_size must be between 1 and {MAX_GROUP_SIZE}")
+        return [assign_group(txns[i:i + group_size]) for i in range(0, len(txns), group_size)]
     
     def created_assets(self, wallet_addr: str) -> list:
         """return a list of created assets"""
-        created_assets = []
-        req = self.indexer_client.account_info(wallet_addr)
-        if "account" in req and "created-assets" in req["account"]:
-            creations = req["account"]["created-assets"]
+        return list(self.iter_created_assets(wallet_addr))
+
+    def iter_created_assets(self, wallet_addr: str, page_size: int = 1000, workers: int = 8) -> Iterator[dict]:
+        """yield created assets page by page, for creators with a large number of assets"""
+        time_stamps = {}
+        next_page = None
+        while True:
+            req = self.indexer_client.lookup_account_asset_by_creator(wallet_addr, limit=page_size, next_page=next_page)
+            creations = req.get("assets", [])
+            rounds = {creation["created-at-round"] for creation in creations} - time_stamps.keys()
+            time_stamps.update(r_block_timestamps(self.indexer_client, rounds, workers))
             for creation in creations:
                 asset = {}
                 asset["name"] = ""
                 asset["unit"] = ""
                 asset["url"] = ""
                 asset["id"] = creation["index"]
-                asset["date_created"] = timestamp_to_string(self.indexer_client.block_info(creation["created-at-round"])["timestamp"])
+                asset["date_created"] = timestamp_to_string(time_stamps[creation["created-at-round"]])
                 if "name" in creation["params"]:
                     asset["name"] = creation["params"]["name"]
                 if "unit-name" in creation["params"]:
                     asset["unit"] = creation["params"]["unit-name"]
                 if "url" in creation["params"]:
                     asset["url"] = creation["params"]["url"]
-                created_assets.append(asset)
-        return created_assets
+                yield asset
+            next_page = req.get("next-token")
+            if not creations or not next_page:
+                break
     
     def freeze_asset(self, sender_addr: str, target_addr: str, asset_id: int,
         eng_id: Union[int, None], fee_addr: str, fee_amount: int) -> dict:
         """freeze an asset for a target_addr"""
+        return self.freeze_group(sender_addr, target_addr, asset_id, eng_id, fee_addr, fee_amount)[0].group
+
+    def freeze_group(self, sender_addr: str, target_addr: str, asset_id: int,
+        eng_id: Union[int, None], fee_addr: str, fee_amount: int, freeze: bool = True) -> list:
+        """the unsigned freeze (or unfreeze) group for a target_addr, ready for Batch.pack_groups"""
 
-        txn1 = AssetFreezeTxn(sender=sender_addr, sp=self.params, index=asset_id, target=target_addr, new_freeze_state=True)
+        txn1 = AssetFreezeTxn(sender=sender_addr, sp=self.params, index=asset_id, target=target_addr, new_freeze_state=freeze)
         txn2 = PaymentTxn(sender_addr, self.params, fee_addr, fee_amount, note="asset interaction fee")
 
         if isinstance(eng_id, int):
@@ -83,7 +160,7 @@ class aEng(AlgodClient, IndexerClient):
         gid = calculate_group_id([txn1, txn2])
         txn1.group = gid
         txn2.group = gid
-        return gid
+        return [txn1, txn2]
 
         # stxn1 = txn1.sign(sender_key)    
         # stxn2 = txn2.sign(sender_key)
@@ -99,18 +176,8 @@ class aEng(AlgodClient, IndexerClient):
     def unfreeze_asset(self, sender_key: str, target_addr: str, asset_id: int,
         eng_id: Union[int, None], fee_addr: str, fee_amount: int) -> dict:
         """unfreeze an asset for a target_address"""
-    
-        txn1 = AssetFreezeTxn(sender=account.address_from_private_key(sender_key), sp=self.params, index=asset_id, target=target_addr, new_freeze_state=False)
-        txn2 = PaymentTxn(account.address_from_private_key(sender_key), self.params, fee_addr, fee_amount, note="asset interaction fee")
-
-        if isinstance(eng_id, int):
-            txn2 = AssetTransferTxn(account.address_from_private_key(sender_key), self.params, fee_addr, fee_amount, eng_id, note="asset interaction fee")
-
-        gid = transaction.calculate_group_id([txn1, txn2])
-        txn1.group = gid
-        txn2.group = gid
-
-        return gid
+        return self.freeze_group(account.address_from_private_key(sender_key), target_addr, asset_id,
+            eng_id, fee_addr, fee_amount, freeze=False)[0].group
 
         # stxn1 = txn1.sign(sender_key)    
         # stxn2 = txn2.sign(sender_key)
@@ -141,7 +208,7 @@ class aEng(AlgodClient, IndexerClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -166,7 +233,7 @@ class aEng(AlgodClient, IndexerClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
@@ -191,7 +258,7 @@ class aEng(AlgodClient, IndexerClient):
         stxn2 = txn2.sign(sender_key)
 
         signed_group =  [stxn1, stxn2]
-        txid = self.algod_client.send_transactions(signed_group)
+        txid = self.send_group(signed_group)
 
         transactioninfo = {}
         transactioninfo['txid'] = txid
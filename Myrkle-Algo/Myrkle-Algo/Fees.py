@@ -0,0 +1,104 @@
+import math
+import threading
+import time
+from collections import deque
+
+import msgpack
+from algosdk.v2client.algod import AlgodClient
+
+from a_constants import ROUND_TIME
+
+MIN_FEE = 1000 # microalgos
+TXN_SIZE = 250 # bytes, a typical signed payment or asset transfer
+
+
+class aFeeEstimator(AlgodClient):
+    def __init__(self, algod_url: str, targets: tuple = (1, 2, 4, 8), window: int = 20,
+        min_capacity: int = 5000, interval: float = ROUND_TIME):
+        self.algod_client = AlgodClient("", algod_url)
+        self.targets = tuple(sorted(targets))
+        self.window = window
+        self.min_capacity = min_capacity
+        self.interval = interval
+        self.block_sizes = deque(maxlen=window)
+        self.last_round = 0
+        self.pool_size = 0
+        self.estimates = {target: MIN_FEE for target in self.targets}
+        self.updated_at = None # time.time() of the last successful update
+        self.last_error = ""
+        self._stop = threading.Event()
+        self._thread = None
+
+    def fee(self, target_rounds: int = 1) -> int:
+        """flat fee in microalgos expected to confirm within target_rounds, read from the last update without a network call"""
+        estimates = self.estimates
+        eligible = [target for target in self.targets if target <= target_rounds] or [self.targets[0]]
+        return estimates[eligible[-1]]
+
+    def capacity(self) -> int:
+        """transactions a round can clear, the largest recent block or min_capacity if blocks were smaller"""
+        return max([self.min_capacity, *self.block_sizes])
+
+    def update(self) -> dict:
+        """read new blocks and the pending pool once and recompute the fee for every target"""
+        current_round = self.algod_client.status()["last-round"]
+        first_round = max(self.last_round + 1, current_round - self.window + 1)
+        for block_round in range(first_round, current_round + 1):
+            block = self.algod_client.block_info(block_round)["block"]
+            self.block_sizes.append(len(block.get("txns", [])))
+        self.last_round = current_round
+
+        params = self.algod_client.suggested_params()
+        base_fee = max(params.min_fee or MIN_FEE, params.fee * TXN_SIZE)
+        self.pool_size = self.algod_client.pending_transactions(max_txns=1).get("total-transactions", 0)
+
+        capacity = self.capacity()
+        estimates = {}
+        congested = [target for target in self.targets if self.pool_size > capacity * target]
+        pending = []
+        if congested:
+            # the pool is returned ordered by fee per byte, so the rate at a target's clearing rank is what it takes to get in.
+            # msgpack gives the signed transactions as encoded, so their sizes are the real ones
+            raw = self.algod_client.pending_transactions(max_txns=capacity * congested[-1], response_format="msgpack")
+            pending = msgpack.unpackb(raw, raw=False).get("top-transactions", [])
+        for target in self.targets:
+            estimate = base_fee
+            if target in congested and pending:
+                stxn = pending[min(capacity * target, len(pending)) - 1]
+                fee_per_byte = stxn["txn"].get("fee", 0) / len(msgpack.packb(stxn, use_bin_type=True))
+                estimate = max(base_fee, math.ceil(fee_per_byte * TXN_SIZE) + 1)
+            estimates[target] = estimate
+        # swap the whole dict so readers on other threads never see a partial update
+        self.estimates = estimates
+        self.updated_at = time.time()
+        self.last_error = ""
+        return estimates
+
+    def is_stale(self, max_age: float = None) -> bool:
+        """True when no update succeeded in the last max_age seconds, 3 intervals by default.
+        the estimates of a stale estimator are the last good ones, or MIN_FEE if it never updated"""
+        max_age = 3 * self.interval if max_age is None else max_age
+        return self.updated_at is None or time.time() - self.updated_at > max_age
+
+    def start(self) -> bool:
+        """keep the estimates up to date from a background thread, once per interval"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> bool:
+        """stop the background updates"""
+        self._stop.set()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.update()
+            except Exception as e:
+                # keep the last estimates until the node answers again, is_stale and last_error tell callers
+                self.last_error = f"{type(e).__name__}: {e}"
+            self._stop.wait(self.interval)
@@ -0,0 +1,127 @@
+import heapq
+from typing import Iterator
+
+from algosdk.v2client.indexer import IndexerClient
+
+from a_constants import ZERO_ADDRESS
+from Misc import lookup_asset
+
+
+def iter_balance_pages(client: IndexerClient, asset_id: int, page_size: int = 1000) -> Iterator[dict]:
+    """yield the raw asset_balances responses of an asset, one page at a time"""
+    next_page = None
+    while True:
+        page = client.asset_balances(asset_id, limit=page_size, next_page=next_page)
+        yield page
+        next_page = page.get("next-token")
+        if not page.get("balances") or not next_page:
+            break
+
+def iter_asset_balances(client: IndexerClient, asset_id: int, page_size: int = 1000) -> Iterator[dict]:
+    """yield every holding of an asset, without keeping more than one page in memory"""
+    for page in iter_balance_pages(client, asset_id, page_size):
+        yield from page.get("balances", [])
+
+def holder_stats(client: IndexerClient, asset_id: int, top_n: int = 10, page_size: int = 1000) -> dict:
+    """holder count, top holders, concentration and circulating supply of an asset, computed from chain data
+    in one streaming pass with bounded memory. the creator, reserve and zero addresses are not counted as holders,
+    their balances are taken out of the circulating supply. amounts are in base units"""
+    params = lookup_asset(client, asset_id)["asset"]["params"]
+    excluded = {address: 0 for address in (params["creator"], params.get("reserve", ""), ZERO_ADDRESS) if address}
+    holders = 0
+    held = 0
+    sum_of_squares = 0
+    top = []
+    for balance in iter_asset_balances(client, asset_id, page_size):
+        address = balance["address"]
+        amount = balance["amount"]
+        if address in excluded:
+            excluded[address] += amount
+            continue
+        if amount == 0:
+            continue
+        holders += 1
+        held += amount
+        sum_of_squares += amount * amount
+        if len(top) < top_n:
+            heapq.heappush(top, (amount, address))
+        elif top and amount > top[0][0]:
+            heapq.heapreplace(top, (amount, address))
+
+    top_holders = [{"address": address, "amount": amount} for amount, address in sorted(top, reverse=True)]
+    top_amount = sum(holder["amount"] for holder in top_holders)
+    return {
+        "asset_id": asset_id,
+        "decimals": params["decimals"],
+        "total_supply": params["total"],
+        "holders": holders,
+        "top_holders": top_holders,
+        "top_share": top_amount / held if held else 0,
+        # herfindahl-hirschman index of the holder balances, 1 when a single holder owns everything
+        "hhi": sum_of_squares / (held * held) if held else 0,
+        "creator_balance": excluded.get(params["creator"], 0),
+        "reserve_balance": excluded.get(params.get("reserve", ""), 0),
+        "burned_supply": excluded.get(ZERO_ADDRESS, 0),
+        "circulating_supply": params["total"] - sum(excluded.values())}
+
+
+class aHolderIndex(IndexerClient):
+    def __init__(self, indexer_url: str, asset_id: int, refresh_rounds: int = 10, page_size: int = 1000):
+        self.indexer_client = IndexerClient("", indexer_url)
+        self.asset_id = asset_id
+        self.refresh_rounds = refresh_rounds
+        self.page_size = page_size
+        self.round = 0
+        self.opted_in = frozenset()
+        self.frozen = frozenset()
+        self.rebuild()
+
+    def rebuild(self) -> int:
+        """rebuild the opted-in and frozen sets in one paged pass over the asset's balances, returns the index round"""
+        opted_in = set()
+        frozen = set()
+        index_round = 0
+        for page in iter_balance_pages(self.indexer_client, self.asset_id, self.page_size):
+            index_round = index_round or page.get("current-round", 0)
+            for balance in page.get("balances", []):
+                opted_in.add(balance["address"])
+                if balance.get("is-frozen"):
+                    frozen.add(balance["address"])
+        # swap whole sets so concurrent readers never see a half built index
+        self.opted_in = frozenset(opted_in)
+        self.frozen = frozenset(frozen)
+        self.round = index_round
+        return index_round
+
+    def refresh(self, current_round: int = None) -> bool:
+        """rebuild the index once it is refresh_rounds behind, returns True if it was rebuilt"""
+        if current_round is None:
+            current_round = self.indexer_client.health()["round"]
+        if current_round - self.round < self.refresh_rounds:
+            return False
+        self.rebuild()
+        return True
+
+    def is_opted_in(self, wallet_addr: str) -> bool:
+        """check if an address is opted in to the asset, without a network call"""
+        return wallet_addr in self.opted_in
+
+    def is_frozen(self, wallet_addr: str) -> bool:
+        """check if the asset is frozen for an address, without a network call"""
+        return wallet_addr in self.frozen
+
+    def set_frozen(self, wallet_addr: str, frozen: bool) -> bool:
+        """apply a freeze or unfreeze seen on chain without a rebuild, used by Watch.aWatcher"""
+        if frozen:
+            self.frozen = self.frozen | {wallet_addr}
+        else:
+            self.frozen = self.frozen - {wallet_addr}
+        return True
+
+    def set_opted_in(self, wallet_addr: str, opted_in: bool, frozen: bool = False) -> bool:
+        """apply an opt-in or close-out seen on chain, an opt-in starts with the asset's default frozen flag"""
+        if opted_in:
+            self.opted_in = self.opted_in | {wallet_addr}
+        else:
+            self.opted_in = self.opted_in - {wallet_addr}
+        return self.set_frozen(wallet_addr, opted_in and frozen)
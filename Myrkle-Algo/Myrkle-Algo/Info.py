@@ -1,65 +1,142 @@
 import base64
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Union
 
-import requests
+from algosdk.error import IndexerHTTPError
 from algosdk.util import microalgos_to_algos
 from algosdk.v2client.algod import AlgodClient
 from algosdk.v2client.indexer import IndexerClient
 
-from Misc import (find_amount_w_decimal, find_amount_w_decimal_id,
+from a_constants import ROUND_TIME
+from Cache import named_cache
+from Holders import holder_stats
+from Misc import (RawRow, current_asset, find_amount_w_decimal, http_session,
+                  lookup_asset, lookup_transaction, r_block_timestamps,
                   timestamp_to_string)
+from Pool import aClientPool
+
+_executor = ThreadPoolExecutor(max_workers=8)
+
+# the sources each get_asset_info field is read from, besides the cached indexer asset lookup
+ASSET_FIELDS = {
+    "name": set(), "unit": set(), "id": set(), "date_created": {"block"},
+    "clawback": set(), "reserve": set(), "freeze": set(), "manager": set(), "creator": set(),
+    "decimals": set(), "supply": set(), "default_frozen": set(), "is_deleted": set(),
+    "price": {"price"}, "description": {"describe"}, "circulating_supply": {"supply"},
+    "burned_supply": {"supply"}, "market_cap": {"price", "supply"},
+}
+# fields that can change on chain, read fresh unless a Watch.aWatcher keeps the cached asset current
+ROLE_FIELDS = {"clawback", "reserve", "freeze", "manager", "default_frozen", "is_deleted"}
+
+
+def _vestige_json(url: str):
+    return http_session().get(url).json()
 
 
 class aInfo(AlgodClient, IndexerClient):
-    def __init__(self, indexer_url: str, algod_url: str):
-        self.indexer_client = IndexerClient("", indexer_url)
-        self.algod_client = AlgodClient("", algod_url)
+    def __init__(self, indexer_url: str, algod_url: str, pool: Union[aClientPool, None] = None):
+        if pool is not None:
+            # shared clients, the urls are taken from the pool
+            self.indexer_client = pool.indexer_client
+            self.algod_client = pool.algod_client
+        else:
+            self.indexer_client = IndexerClient("", indexer_url)
+            self.algod_client = AlgodClient("", algod_url)
     
     def get_account_info(self, wallet_addr: str) -> dict:
         """return information on an account"""
         account_info = {}
-        algod_req = self.algod_client.account_info(wallet_addr)
-        indexer_req = self.indexer_client.account_info(wallet_addr)
+        snapshot = self.account_snapshot(wallet_addr)
+        algod_req = snapshot["algod"]
+        indexer_req = snapshot["indexer"]
         if "account" in indexer_req and "address" in indexer_req["account"] and "address" in algod_req:
             account_info["account"] = algod_req["address"]
             account_info["balance"] = str(microalgos_to_algos(algod_req["amount"]))
-            account_info["min_balance"] = str(microalgos_to_algos(algod_req["min_balance"]))
+            account_info["min_balance"] = str(microalgos_to_algos(algod_req["min-balance"]))
             account_info["pending_rewards"] = algod_req["pending-rewards"]
             account_info["status"] = algod_req["status"]
             account_info["asset_count"] = algod_req["total-assets-opted-in"]
             account_info["app_count"] = algod_req["total-apps-opted-in"]
             account_info["created_asset_count"] = algod_req["total-created-assets"]
             account_info["created_app_count"] = algod_req["total-created-apps"]
+            account_info["round"] = snapshot["round"]
             # indexer begins here
-            account_info["date_created"] = timestamp_to_string(self.indexer_client.block_info(algod_req["account"]["created-at-round"])["timestamp"])
-            account_info["block_created"] = algod_req["account"]["created-at-round"]
-            account_info["is_deleted"] = algod_req["account"]["deleted"]
-            account_info["type"] = algod_req["account"]["sig-type"]
+            created_round = indexer_req["account"]["created-at-round"]
+            account_info["date_created"] = timestamp_to_string(r_block_timestamps(self.indexer_client, [created_round])[created_round])
+            account_info["block_created"] = created_round
+            account_info["is_deleted"] = indexer_req["account"]["deleted"]
+            account_info["type"] = indexer_req["account"].get("sig-type", "")
             # box bytes and stuff
         return account_info
-        
-    def get_asset_info(self, asset_id: int) -> dict:
-        """return information on an asset"""
+
+    def account_snapshot(self, wallet_addr: str) -> dict:
+        """algod and indexer account_info fetched in parallel and pinned to the same round where possible,
+        cached by address and round so repeated reads within a round are free"""
+        cache = named_cache("account_snapshot", maxsize=16384)
+        latest_round = named_cache("latest_round", ttl=ROUND_TIME).get(self.algod_client.algod_address)
+        snapshot = cache.get((self.algod_client.algod_address, wallet_addr, latest_round))
+        if snapshot is not None:
+            return snapshot
+        indexer_future = _executor.submit(self.indexer_client.account_info, wallet_addr)
+        algod_req = self.algod_client.account_info(wallet_addr)
+        indexer_req = indexer_future.result()
+        algod_round = algod_req.get("round")
+        if algod_round is not None and indexer_req.get("current-round", 0) > algod_round:
+            # the indexer is ahead of algod, so read it back at the algod round
+            try:
+                indexer_req = self.indexer_client.account_info(wallet_addr, round_num=algod_round)
+            except IndexerHTTPError:
+                pass
+        snapshot = {"round": algod_round, "algod": algod_req, "indexer": indexer_req}
+        if algod_round is not None:
+            cache.set((self.algod_client.algod_address, wallet_addr, algod_round), snapshot)
+            named_cache("latest_round", ttl=ROUND_TIME).set(self.algod_client.algod_address, algod_round)
+        return snapshot
+
+    def get_asset_info(self, asset_id: int, fields: Iterable[str] = None, chain_supply: bool = False) -> dict:
+        """return information on an asset
+        fields selects the keys to return, each source is only queried when one of its fields is requested,
+        so a name lookup costs one cached indexer call, role fields are read like the Misc role helpers
+        chain_supply=True computes circulating and burned supply from the asset's balances instead of Vestige"""
+        wanted = set(ASSET_FIELDS) if fields is None else set(fields)
+        unknown = wanted - set(ASSET_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown asset fields: {', '.join(sorted(unknown))}")
+        sources = set().union(*(ASSET_FIELDS[field] for field in wanted))
+        external = {}
+        if "price" in sources:
+            external["price"] = _executor.submit(_vestige_json, f"https://free-api.vestige.fi/asset/{asset_id}/price")
+        if "supply" in sources and chain_supply:
+            external["supply"] = _executor.submit(self._chain_supply, asset_id)
+        elif "supply" in sources:
+            external["supply"] = _executor.submit(_vestige_json, f"https://free-api.vestige.fi/asset/{asset_id}")
+        if "describe" in sources:
+            external["describe"] = _executor.submit(_vestige_json, f"https://indexer.algoexplorerapi.io/v2/assets/{asset_id}?include-all=true")
+        if wanted & ROLE_FIELDS:
+            req = current_asset(self.indexer_client, asset_id)
+        else:
+            req = lookup_asset(self.indexer_client, asset_id)
+        price_info = external["price"].result() if "price" in external else None
+        supply_info = external["supply"].result() if "supply" in external else None
+        describe = external["describe"].result() if "describe" in external else None
+
         asset_info = {}
-        price_info = requests.get(f"https://free-api.vestige.fi/asset/{asset_id}/price").json()
-        supply_info = requests.get(f"https://free-api.vestige.fi/asset/{asset_id}").json()
-        describe = requests.get(f"https://indexer.algoexplorerapi.io/v2/assets/{asset_id}?include-all=true").json()
-        req = self.indexer_client.asset_info(asset_id)
         if "asset" in req:
-            asset_info["name"] = ""
-            asset_info["unit"] = ""
-            if "name" in req["asset"]["params"]:
-                asset_info["name"] = req["asset"]["params"]["name"]
-            if "unit-name" in req["asset"]["params"]:
-                asset_info["unit"] = req["asset"]["params"]["unit-name"]
+            params = req["asset"]["params"]
+            asset_info["name"] = params.get("name", "")
+            asset_info["unit"] = params.get("unit-name", "")
             asset_info["id"] = req["asset"]["index"]
-            asset_info["date_created"] = timestamp_to_string(self.indexer_client.block_info(req["asset"]["created-at-round"])["timestamp"])
-            asset_info["clawback"] = req["asset"]["params"]["clawback"]
-            asset_info["reserve"] = req["asset"]["params"]["reserve"]
-            asset_info["freeze"] = req["asset"]["params"]["freeze"]
-            asset_info["manager"] = req["asset"]["params"]["manager"]
-            asset_info["creator"] = req["asset"]["params"]["creator"]
-            asset_info["supply"] = find_amount_w_decimal(req["asset"]["params"]["total"], req["asset"]["params"]["decimals"])
-            asset_info["default_frozen"] = req["asset"]["params"]["default-frozen"]
+            if "date_created" in wanted:
+                created_round = req["asset"]["created-at-round"]
+                asset_info["date_created"] = timestamp_to_string(r_block_timestamps(self.indexer_client, [created_round])[created_round])
+            asset_info["clawback"] = params["clawback"]
+            asset_info["reserve"] = params["reserve"]
+            asset_info["freeze"] = params["freeze"]
+            asset_info["manager"] = params["manager"]
+            asset_info["creator"] = params["creator"]
+            asset_info["decimals"] = params["decimals"]
+            asset_info["supply"] = find_amount_w_decimal(params["total"], params["decimals"])
+            asset_info["default_frozen"] = params["default-frozen"]
             asset_info["is_deleted"] = req["asset"]["deleted"]
             asset_info["price"] = 0
             asset_info["description"] = ""
@@ -75,12 +152,20 @@ class aInfo(AlgodClient, IndexerClient):
                 asset_info["burned_supply"] = find_amount_w_decimal(int(supply_info["burned_supply"]), supply_info["decimals"])
             if isinstance(describe, dict) and "asset" in describe and "verification" in describe["asset"] and "description" in describe["asset"]["verification"]:
                 asset_info["description"] = describe["asset"]["verification"]["description"]
+            asset_info = {key: value for key, value in asset_info.items() if key in wanted}
         return asset_info
 
-    def pay_txn_info(self, txid: str) -> dict:
-        """detailed info on a payment transaction"""
+    def _chain_supply(self, asset_id: int) -> dict:
+        stats = holder_stats(self.indexer_client, asset_id, top_n=0)
+        return {"circulating_supply": stats["circulating_supply"], "burned_supply": stats["burned_supply"], "decimals": stats["decimals"]}
+
+    def pay_txn_info(self, txid: str, raw: bool = False) -> dict:
+        """detailed info on a payment transaction
+        raw=True returns a RawRow of integers that formats lazily through fmt"""
+        req = lookup_transaction(self.indexer_client, txid)
+        if raw:
+            return self._raw_pay_txn_info(req)
         txn_info = {}
-        req = self.indexer_client.transaction(txid)
         if "transaction" in req:
             txn_info["sender"] = req["transaction"]["sender"]
             if "payment-transaction" in req["transaction"]:
@@ -89,10 +174,11 @@ class aInfo(AlgodClient, IndexerClient):
                 txn_info["asset_id"] = 0
                 txn_info["name"] = "ALGO"
             if "asset-transfer-transaction" in req["transaction"]:
+                asset = self.get_asset_info(req["transaction"]["asset-transfer-transaction"]["asset-id"], ("name", "decimals"))
                 txn_info["receiver"] = req["transaction"]["asset-transfer-transaction"]["receiver"]
-                txn_info["amount"] = find_amount_w_decimal_id(self.indexer_client, req["transaction"]["asset-transfer-transaction"]["amount"], req["transaction"]["asset-transfer-transaction"]["asset-id"])
+                txn_info["amount"] = find_amount_w_decimal(req["transaction"]["asset-transfer-transaction"]["amount"], asset["decimals"])
                 txn_info["asset_id"] = req["transaction"]["asset-transfer-transaction"]["asset-id"]
-                txn_info["name"] = self.get_asset_info(req["transaction"]["asset-transfer-transaction"]["asset-id"])["name"]
+                txn_info["name"] = asset["name"]
             txn_info["timestamp"] = timestamp_to_string(req["transaction"]["round-time"])
             txn_info["txid"] = req["transaction"]["id"]
             txn_info["tx_type"] = req["transaction"]["tx-type"]
@@ -101,3 +187,29 @@ class aInfo(AlgodClient, IndexerClient):
             if "note" in req["transaction"]:
                 txn_info["note"] = base64.b64decode(req['transaction']['note']).decode()
         return txn_info
+
+    def _raw_pay_txn_info(self, req: dict) -> RawRow:
+        txn_info = RawRow()
+        if "transaction" in req:
+            transaction = req["transaction"]
+            txn_info["sender"] = transaction["sender"]
+            if "payment-transaction" in transaction:
+                txn_info["receiver"] = transaction["payment-transaction"]["receiver"]
+                txn_info["amount"] = transaction["payment-transaction"]["amount"]
+                txn_info["asset_id"] = 0
+                txn_info["name"] = "ALGO"
+            if "asset-transfer-transaction" in transaction:
+                params = lookup_asset(self.indexer_client, transaction["asset-transfer-transaction"]["asset-id"])["asset"]["params"]
+                txn_info["receiver"] = transaction["asset-transfer-transaction"]["receiver"]
+                txn_info["amount"] = transaction["asset-transfer-transaction"]["amount"]
+                txn_info["decimal"] = params.get("decimals", 0)
+                txn_info["asset_id"] = transaction["asset-transfer-transaction"]["asset-id"]
+                txn_info["name"] = params.get("name", "")
+            txn_info["round_time"] = transaction["round-time"]
+            txn_info["txid"] = transaction["id"]
+            txn_info["tx_type"] = transaction["tx-type"]
+            txn_info["fee"] = transaction["fee"]
+            txn_info["note"] = ""
+            if "note" in transaction:
+                txn_info["note"] = base64.b64decode(transaction['note']).decode()
+        return txn_info
\ No newline at end of file
@@ -0,0 +1,159 @@
+import base64
+import sqlite3
+import threading
+import time
+import urllib.error
+
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError, IndexerHTTPError
+from algosdk.v2client.algod import AlgodClient
+from algosdk.v2client.indexer import IndexerClient
+
+from a_constants import ROUND_TIME
+
+OPEN = ("pending", "sent")
+
+
+class aJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS groups (
+            txid TEXT PRIMARY KEY,
+            blob BLOB NOT NULL,
+            last_valid INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT NOT NULL DEFAULT '',
+            created REAL NOT NULL,
+            updated REAL NOT NULL)""")
+
+    def record(self, signed_group: list) -> str:
+        """write a signed group to the journal before it is sent, returns the txid of its first transaction.
+        recording a group twice is a no-op, since its txid is deterministic"""
+        txid = signed_group[0].get_txid()
+        blob = b"".join(base64.b64decode(encoding.msgpack_encode(stxn)) for stxn in signed_group)
+        # a group stops being valid as soon as any one of its transactions does
+        last_valid = min(stxn.transaction.last_valid_round for stxn in signed_group)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO groups (txid, blob, last_valid, status, created, updated) VALUES (?, ?, ?, 'pending', ?, ?)",
+                (txid, blob, last_valid, now, now))
+        return txid
+
+    def submit(self, algod_client: AlgodClient, signed_group: list) -> str:
+        """journal a signed group then send it, returns the txid like send_transactions.
+        a node that is down or times out leaves the group pending for resubmit instead of raising,
+        a group the node rejects is marked rejected and the error is raised"""
+        txid = self.record(signed_group)
+        if self.status(txid) not in OPEN:
+            return txid # journaled by an earlier call and already settled
+        status, error = self._send(algod_client, txid, self._blob(txid))
+        if status == "rejected":
+            raise AlgodHTTPError(error, 400)
+        return txid
+
+    def resubmit(self, algod_client: AlgodClient, indexer_client: IndexerClient = None) -> dict:
+        """one pass over the open groups: mark confirmed, expired or rejected ones and resend the rest.
+        algod forgets confirmed transactions after a while, so a group past its last valid round is looked up
+        on the indexer before it is called expired. without indexer_client it is marked unknown instead.
+        returns how many groups ended in each status"""
+        counts = {}
+        current_round = algod_client.status()["last-round"]
+        for txid, last_valid in self.open_groups():
+            status = self._confirmed_status(algod_client, txid)
+            if status is None and current_round > last_valid:
+                status = self._lapsed_status(indexer_client, txid, last_valid)
+            elif status is None:
+                status, _ = self._send(algod_client, txid, self._blob(txid))
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def resubmit_until_settled(self, algod_client: AlgodClient, indexer_client: IndexerClient = None,
+        interval: float = ROUND_TIME, timeout: float = None) -> dict:
+        """resubmit every round until no group is left open, or timeout seconds pass; returns the final status counts"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.open_groups():
+            try:
+                self.resubmit(algod_client, indexer_client)
+            except (urllib.error.URLError, OSError, AlgodHTTPError, IndexerHTTPError):
+                pass # the node is unreachable, keep every group open and retry next round
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+        return self.status_counts()
+
+    def open_groups(self) -> list:
+        """(txid, last_valid) of every group that is not settled yet"""
+        with self._lock:
+            return self._db.execute("SELECT txid, last_valid FROM groups WHERE status IN (?, ?) ORDER BY created", OPEN).fetchall()
+
+    def status(self, txid: str) -> str:
+        """return the journal status of a group: pending, sent, confirmed, expired, rejected or unknown"""
+        with self._lock:
+            row = self._db.execute("SELECT status FROM groups WHERE txid = ?", (txid,)).fetchone()
+        return row[0] if row else None
+
+    def status_counts(self) -> dict:
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM groups GROUP BY status").fetchall())
+
+    def _confirmed_status(self, algod_client: AlgodClient, txid: str):
+        try:
+            info = algod_client.pending_transaction_info(txid)
+        except AlgodHTTPError:
+            return None # not in the pool, either never arrived or dropped
+        if info.get("confirmed-round", 0) > 0:
+            self._update(txid, "confirmed")
+            return "confirmed"
+        if info.get("pool-error"):
+            self._update(txid, "rejected", info["pool-error"])
+            return "rejected"
+        return None
+
+    def _lapsed_status(self, indexer_client: IndexerClient, txid: str, last_valid: int):
+        # past its last valid round and not in algod's pool: either it confirmed and algod forgot it, or it never will
+        if indexer_client is None:
+            self._update(txid, "unknown", "last valid round passed, check the txid before sending again")
+            return "unknown"
+        try:
+            info = indexer_client.transaction(txid)
+            if info.get("transaction", {}).get("confirmed-round"):
+                self._update(txid, "confirmed")
+                return "confirmed"
+        except IndexerHTTPError:
+            pass # not found
+        if indexer_client.health()["round"] < last_valid:
+            return "sent" # the indexer has not caught up to the last valid round, a miss proves nothing yet
+        self._update(txid, "expired", "last valid round passed")
+        return "expired"
+
+    def _send(self, algod_client: AlgodClient, txid: str, blob: bytes) -> tuple:
+        try:
+            algod_client.send_raw_transaction(base64.b64encode(blob))
+            status, error = "sent", ""
+        except AlgodHTTPError as e:
+            if "already in ledger" in str(e):
+                # algod says this for a group still waiting in its pool too, so only a lookup may confirm it
+                status, error = "sent", ""
+            elif e.code == 400:
+                # only a bad request is the group's fault, throttling (429) and token errors (401/403) pass and are retried
+                status, error = "rejected", str(e)
+            else:
+                status, error = "pending", str(e)
+        except (urllib.error.URLError, OSError) as e:
+            status, error = "pending", str(e)
+        self._update(txid, status, error, attempted=True)
+        return status, error
+
+    def _blob(self, txid: str) -> bytes:
+        with self._lock:
+            return self._db.execute("SELECT blob FROM groups WHERE txid = ?", (txid,)).fetchone()[0]
+
+    def _update(self, txid: str, status: str, error: str = "", attempted: bool = False):
+        with self._lock:
+            self._db.execute("UPDATE groups SET status = ?, error = ?, attempts = attempts + ?, updated = ? WHERE txid = ?",
+                (status, error, int(attempted), time.time(), txid))
@@ -1,19 +1,114 @@
 import base64
 import hashlib
-from datetime import datetime
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Union
 
 import requests
+from algosdk.constants import algod_auth_header
 from algosdk.encoding import is_valid_address
+from algosdk.error import IndexerHTTPError
+from algosdk.util import microalgos_to_algos
+from algosdk.v2client.algod import AlgodClient
 from algosdk.v2client.indexer import IndexerClient
 
+from Cache import named_cache
+
+_local = threading.local()
+_covered = Counter() # (indexer key, asset_id) -> running watchers keeping the asset's caches current
+_covered_lock = threading.Lock()
+PRICE_TTL = 60 # seconds
+ASSET_TTL = 300 # seconds
+
+
+def http_session() -> requests.Session:
+    """return a requests session owned by the calling thread, so its connections are kept alive and reused"""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def algod_get(client: AlgodClient, path: str, params: dict = None, timeout: float = 30,
+    response_format: str = "json") -> Union[dict, bytes]:
+    """GET an algod v2 endpoint over the calling thread's session instead of a new connection per request.
+    response_format="msgpack" asks algod for msgpack and returns the undecoded bytes"""
+    headers = {algod_auth_header: client.algod_token}
+    if client.headers:
+        headers.update(client.headers)
+    if response_format == "msgpack":
+        params = {**(params or {}), "format": "msgpack"}
+    response = http_session().get(f"{client.algod_address.rstrip('/')}/v2{path}", params=params, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.content if response_format == "msgpack" else response.json()
+
+def indexer_key(client: IndexerClient) -> str:
+    """the address caches key an indexer by, the same with or without a trailing slash"""
+    return client.indexer_address.rstrip("/")
+
+def cover_assets(indexer_url: str, asset_ids: Iterable[int]) -> bool:
+    """mark assets as kept current by a running Watch.aWatcher, the role and frozen helpers only read covered assets from cache"""
+    with _covered_lock:
+        for asset_id in asset_ids:
+            _covered[(indexer_url.rstrip("/"), asset_id)] += 1
+    return True
+
+def uncover_assets(indexer_url: str, asset_ids: Iterable[int]) -> list:
+    """undo cover_assets for one watcher, returns the assets no other running watcher covers"""
+    uncovered = []
+    with _covered_lock:
+        for asset_id in asset_ids:
+            key = (indexer_url.rstrip("/"), asset_id)
+            _covered[key] -= 1
+            if _covered[key] <= 0:
+                del _covered[key]
+                uncovered.append(asset_id)
+    return uncovered
+
+def is_covered(client: IndexerClient, asset_id: int) -> bool:
+    return (indexer_key(client), asset_id) in _covered
+
+def current_asset(client: IndexerClient, asset_id: int) -> dict:
+    """the indexer asset_info response with up to date roles: from cache while a watcher covers the asset, fetched otherwise"""
+    return lookup_asset(client, asset_id) if is_covered(client, asset_id) else client.asset_info(asset_id)
 
 def get_token_price(asset_id: int):
     price = 0
-    price_info = requests.get(f"https://free-api.vestige.fi/asset/{asset_id}/price").json()
+    price_info = http_session().get(f"https://free-api.vestige.fi/asset/{asset_id}/price").json()
     if isinstance(price_info, dict) and "USD" in price_info:
         price = price_info["USD"]
     return price
 
+def get_token_prices(asset_ids: Iterable[int], workers: int = 16) -> dict:
+    """return {asset_id: USD price} for many assets, each unique asset is priced once, concurrently and cached"""
+    cache = named_cache("token_price", ttl=PRICE_TTL, maxsize=65536)
+    prices = {}
+    missing = []
+    for asset_id in set(asset_ids):
+        price = cache.get(asset_id)
+        if price is None:
+            missing.append(asset_id)
+        else:
+            prices[asset_id] = price
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            for asset_id, price in zip(missing, executor.map(_token_price_or_none, missing)):
+                if price is None:
+                    # a failed lookup is priced at 0 but not cached, so the next call retries it
+                    price = 0
+                else:
+                    cache.set(asset_id, price)
+                prices[asset_id] = price
+    return prices
+
+def _token_price_or_none(asset_id: int):
+    try:
+        return get_token_price(asset_id)
+    except (requests.RequestException, ValueError):
+        return None
+
 def ___valid_address(addr: str) -> bool:
     """check if an address is valid"""
     return is_valid_address(addr)
@@ -33,7 +128,7 @@ def find_amount_w_decimal_id(client: IndexerClient, amount: int, asset_id: int)
     """specify the asset id, it will automatically search the asset and return the amount with asset decimals
     a promax version of the above code """
     value = 0
-    asset_info = client.asset_info(asset_id=asset_id)
+    asset_info = lookup_asset(client, asset_id)
     decimal = asset_info['asset']['params']['decimals']
     if decimal != 0:
         result = '{:.19f}'.format(amount * 10**-decimal)
@@ -42,19 +137,82 @@ def find_amount_w_decimal_id(client: IndexerClient, amount: int, asset_id: int)
         value = amount
     return value
 
+HISTORY_FILTERS = ("address_role", "min_round", "max_round", "start_time", "end_time", "note_prefix", "min_amount")
+
+def history_filters(filters: dict) -> dict:
+    """check history query options and convert them to the indexer's server side filters
+    times may be unix timestamps, datetimes or RFC 3339 strings, note_prefix may be str or bytes"""
+    unknown = set(filters) - set(HISTORY_FILTERS)
+    if unknown:
+        raise TypeError(f"unknown history filters: {', '.join(sorted(unknown))}")
+    query = dict(filters)
+    for key in ("start_time", "end_time"):
+        if isinstance(query.get(key), (int, float)):
+            query[key] = datetime.fromtimestamp(query[key], timezone.utc)
+        if isinstance(query.get(key), datetime):
+            # naive datetimes are taken as local time, like timestamp_to_string
+            query[key] = query[key].astimezone().isoformat()
+    if isinstance(query.get("note_prefix"), str):
+        query["note_prefix"] = query["note_prefix"].encode()
+    return query
+
+@lru_cache(maxsize=65536)
 def timestamp_to_string(timestamp: int) -> str:
-    """converts a timestamp to a string"""
+    """converts a timestamp to a string, memoized since many rows share a round time"""
     dt_obj = datetime.fromtimestamp(timestamp)
     date_time = dt_obj.strftime("%d-%m-%Y, %H:%M:%S")
     return date_time
 
-def meta_hash_file_data(filename: str) -> bytes:
-    """Takes any byte data and returns the SHA512/256 hash in base64. in summary: hashes a file"""
-    filebytes = open(filename, 'rb').read()
+class RawRow(dict):
+    """a history row of raw values (unix round_time, base unit amount, microalgo fee),
+    fmt formats a field only when it is read, the way the default mode returns it"""
+    def __init__(self, *args, explorer_tx_url: str = "", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.explorer_tx_url = explorer_tx_url
+        self._formatted = {}
+
+    def fmt(self, key: str):
+        """return a field formatted, computed on first read and then reused"""
+        if key not in self._formatted:
+            self._formatted[key] = self._format(key)
+        return self._formatted[key]
+
+    def _format(self, key: str):
+        if key == "timestamp":
+            return timestamp_to_string(self["round_time"])
+        if key == "amount" and "decimal" in self:
+            return find_amount_w_decimal(self["amount"], self["decimal"]) if self["decimal"] else self["amount"]
+        if key in ("amount", "fee"):
+            return str(microalgos_to_algos(self[key]))
+        if key == "link":
+            return f"{self.explorer_tx_url}{self['txid']}"
+        return self[key]
+
+def meta_hash_file_data(filename: str, chunk_size: int = 1 << 20) -> bytes:
+    """Takes any byte data and returns the SHA512/256 hash in base64. in summary: hashes a file
+    the file is streamed through one reusable buffer, so memory stays constant whatever its size"""
     h = hashlib.sha256()
-    h.update(filebytes)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(filename, 'rb') as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            h.update(view[:size])
     return h.digest()
 
+def meta_hash_directory(directory: Union[str, Path], pattern: str = "*", recursive: bool = False,
+    workers: Union[int, None] = None) -> dict:
+    """hashes every file in a directory across a process pool, returns {path: hash} ready to pass as mt_hash"""
+    paths = Path(directory).rglob(pattern) if recursive else Path(directory).glob(pattern)
+    filenames = sorted(str(path) for path in paths if path.is_file())
+    if not filenames:
+        return {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        digests = executor.map(meta_hash_file_data, filenames, chunksize=4)
+        return dict(zip(filenames, digests))
+
 def meta_hash_text(string: str) -> bytes:
     """ Takes any byte data and returns the SHA512/256 hash in base64. in summary: hashes a text """
     s = hashlib.sha256()
@@ -75,34 +233,35 @@ def all_assets_ownedby_creator(client: IndexerClient, asset_id: int) -> bool:
     total_supply = asset['asset']['params']['total']
 
     acc_info = client.account_info(creator)
-    assets = acc_info['account']['assets']
-    if assets != []:
-        for item in assets:
-            asset_index = item['asset-id']
-            balance = item['amount']
-            if asset_index == asset_id:
-                return balance == total_supply
-            else:
-                return False
+    assets = acc_info['account'].get('assets', [])
+    for item in assets:
+        if item['asset-id'] == asset_id:
+            return item['amount'] == total_supply
+    return False
 
 def holding_in_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     """check if an address is opted in to an asset"""
     response = client.account_info(wallet_addr)
-    assets = response['account']['assets']
-    for asset in assets:
-        return asset_id in asset.values()
+    assets = response['account'].get('assets', [])
+    return any(asset['asset-id'] == asset_id for asset in assets)
 
 def frozen_for_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
-    """check if an asset is frozen for an address"""
+    """check if an asset is frozen for an address, from cache while a Watch.aWatcher covers the asset, fetched otherwise"""
+    if not is_covered(client, asset_id):
+        return _frozen_for_address(client, asset_id, wallet_addr)
+    cache = named_cache("asset_frozen", ttl=ASSET_TTL, maxsize=65536)
+    return cache.get_or_set((indexer_key(client), asset_id, wallet_addr), lambda: _frozen_for_address(client, asset_id, wallet_addr))
+
+def _frozen_for_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     response = client.account_info(wallet_addr)
-    assets = response['account']['assets']
+    assets = response['account'].get('assets', [])
     for asset in assets:
-        if asset_id in asset.values():
+        if asset['asset-id'] == asset_id:
             return asset['is-frozen']
 
 def is_manager_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     """check if a specified address is the manager address"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         manager = response['asset']['params']['manager']
         return wallet_addr == manager
@@ -111,7 +270,7 @@ def is_manager_address(client: IndexerClient, asset_id: int, wallet_addr: str) -
 
 def is_creator_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     """check if a specified address is the creator address"""
-    response = client.asset_info(asset_id)
+    response = lookup_asset(client, asset_id)
     if 'asset' in response:
         creator = response['asset']['params']['creator']
         return wallet_addr == creator
@@ -120,7 +279,7 @@ def is_creator_address(client: IndexerClient, asset_id: int, wallet_addr: str) -
 
 def is_freeze_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     """check if a specified address is the freeze address"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         freeze = response['asset']['params']['freeze']
         return wallet_addr == freeze
@@ -129,7 +288,7 @@ def is_freeze_address(client: IndexerClient, asset_id: int, wallet_addr: str) ->
 
 def is_clawback_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     """check if a specified address is the clawback address"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         clawback = response['asset']['params']['clawback']
         return wallet_addr == clawback
@@ -138,7 +297,7 @@ def is_clawback_address(client: IndexerClient, asset_id: int, wallet_addr: str)
 
 def is_reserve_address(client: IndexerClient, asset_id: int, wallet_addr: str) -> bool:
     """check if a specified address is the reserve address"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         reserve = response['asset']['params']['reserve']
         return wallet_addr == reserve
@@ -147,7 +306,7 @@ def is_reserve_address(client: IndexerClient, asset_id: int, wallet_addr: str) -
 
 def can_clawback(client: IndexerClient, asset_id: int) -> bool:
     """check if an asset can be clawedback"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         clawback = response['asset']['params']['clawback']
         return clawback != ""
@@ -156,7 +315,7 @@ def can_clawback(client: IndexerClient, asset_id: int) -> bool:
 
 def can_manage(client: IndexerClient, asset_id: int) -> bool:
     """check if an asset can be managed"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         manager = response['asset']['params']['manager']
         return manager != ""
@@ -165,7 +324,7 @@ def can_manage(client: IndexerClient, asset_id: int) -> bool:
 
 def can_freeze(client: IndexerClient, asset_id: int) -> bool:
     """check if an asset can be frozen"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         freeze = response['asset']['params']['freeze']
         return freeze != ""
@@ -174,7 +333,7 @@ def can_freeze(client: IndexerClient, asset_id: int) -> bool:
 
 def can_reserve(client: IndexerClient, asset_id: int) -> bool:
     """check if an asset can be reserved"""
-    response = client.asset_info(asset_id)
+    response = current_asset(client, asset_id)
     if 'asset' in response:
         reserve = response['asset']['params']['reserve']
         return reserve != ""
@@ -183,7 +342,7 @@ def can_reserve(client: IndexerClient, asset_id: int) -> bool:
 
 def is_default_frozen(client: IndexerClient, asset_id: int) -> bool:
     """check if an asset is frozen by default"""
-    response = client.asset_info(asset_id)
+    response = lookup_asset(client, asset_id)
     if 'asset' in response:
         df_frozen = response['asset']['params']['default-frozen']
         return df_frozen
@@ -192,7 +351,7 @@ def is_default_frozen(client: IndexerClient, asset_id: int) -> bool:
 
 def is_nft(client: IndexerClient, asset_id: int) -> bool:
     """check if an asset is an zero decimal, hence an nft"""
-    response = client.asset_info(asset_id)
+    response = lookup_asset(client, asset_id)
     if 'asset' in response:
         decimal = response['asset']['params']['decimals']
         return decimal <= 0
@@ -205,6 +364,25 @@ def r_block_time(client: IndexerClient, block: int) -> str:
     date_time = timestamp_to_string(time_stamp)
     return date_time
 
+def r_block_timestamps(client: IndexerClient, blocks: Iterable[int], workers: int = 8) -> dict:
+    """return the unix timestamp of many blocks, each round is fetched once and concurrently"""
+    cache = named_cache("block_timestamp", maxsize=65536)
+    time_stamps = {}
+    missing = []
+    for block in set(blocks):
+        time_stamp = cache.get((indexer_key(client), block))
+        if time_stamp is None:
+            missing.append(block)
+        else:
+            time_stamps[block] = time_stamp
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            stamps = executor.map(lambda block: client.block_info(block)["timestamp"], missing)
+            for block, time_stamp in zip(missing, stamps):
+                cache.set((indexer_key(client), block), time_stamp)
+                time_stamps[block] = time_stamp
+    return time_stamps
+
 def r_nft_holding_address(client: IndexerClient, asset_id: int) -> dict:
     """return the address holding a unique nft"""
     holder = {}
@@ -216,31 +394,86 @@ def r_nft_holding_address(client: IndexerClient, asset_id: int) -> dict:
             holder["amount"] = balance["amount"]
     return holder
 
+def lookup_asset(client: IndexerClient, asset_id: int) -> dict:
+    """return the indexer asset_info response for an asset, cached for ASSET_TTL.
+    roles can change within that time, current_asset only reads it while a Watch.aWatcher keeps the entry current"""
+    cache = named_cache("asset_info", ttl=ASSET_TTL, maxsize=65536)
+    return cache.get_or_set((indexer_key(client), asset_id), lambda: client.asset_info(asset_id))
+
+def lookup_transaction(client: IndexerClient, txid: str) -> dict:
+    """return the indexer response for a txid, confirmed transactions are cached since they never change"""
+    cache = named_cache("transaction", maxsize=65536)
+    response = cache.get((indexer_key(client), txid))
+    if response is None:
+        response = client.transaction(txid)
+        if 'confirmed-round' in response.get('transaction', {}):
+            cache.set((indexer_key(client), txid), response)
+    return response
+
+class TxnView:
+    """a transaction fetched once, exposing every field the r_* helpers read"""
+    def __init__(self, client: IndexerClient, txid: str, response: dict = None):
+        self.txid = txid
+        self.response = response if response is not None else lookup_transaction(client, txid)
+        self.transaction = self.response['transaction']
+
+    @property
+    def successful(self) -> bool:
+        return 'confirmed-round' in self.transaction
+
+    @property
+    def block(self) -> int:
+        return self.transaction.get('confirmed-round')
+
+    @property
+    def round_time(self) -> int:
+        return self.transaction.get('round-time')
+
+    @property
+    def time(self) -> str:
+        return timestamp_to_string(self.transaction['round-time'])
+
+    @property
+    def note(self) -> str:
+        if 'note' in self.transaction:
+            return base64.b64decode(self.transaction['note']).decode()
+
+    @property
+    def created_id(self) -> int:
+        return self.transaction.get('created-asset-index')
+
+def resolve_transactions(client: IndexerClient, txids: Iterable[str], workers: int = 16) -> dict:
+    """look up many txids concurrently, deduplicated and cached, returns {txid: TxnView}, None for unknown txids"""
+    unique_txids = list(dict.fromkeys(txids))
+    if not unique_txids:
+        return {}
+
+    def resolve(txid: str):
+        try:
+            return TxnView(client, txid)
+        except IndexerHTTPError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(unique_txids))) as executor:
+        return dict(zip(unique_txids, executor.map(resolve, unique_txids)))
+
 def transaction_successful(client: IndexerClient, txid: str) -> str:
     """check if a transaction was successful"""
-    response = client.transaction(txid)
-    if 'confirmed-round' in response['transaction']:
+    if TxnView(client, txid).successful:
         return 'success'
 
 def r_transaction_time(client: IndexerClient, txid: str) -> str:
     """return the time a transaction was verified"""
-    response = client.transaction(txid)
-    return timestamp_to_string(response["transaction"]["round-time"])
+    return TxnView(client, txid).time
 
 def r_note_from_txid(client: IndexerClient, txid: str) -> str:
     """return a note from txid"""
-    response = client.transaction(txid)
-    if 'note' in response['transaction']:
-        return base64.b64decode(response['transaction']['note']).decode()
+    return TxnView(client, txid).note
 
 def r_block_of_txid(client: IndexerClient, txid: str) -> str:
     """return the block a txn was confirmed in"""
-    response = client.transaction(txid)
-    if 'confirmed-round' in response['transaction']:
-        return response['transaction']['confirmed-round']
+    return TxnView(client, txid).block
 
 def r_created_id(client: IndexerClient, txid: str) -> int:
     """returns a created asset id from a transaction id"""
-    info = client.transaction(txid)
-    asset_id = info['transaction']['created-asset-index']
-    return asset_id
\ No newline at end of file
+    return TxnView(client, txid).created_id
\ No newline at end of file
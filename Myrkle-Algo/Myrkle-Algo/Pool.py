@@ -0,0 +1,81 @@
+import copy
+import threading
+import time
+
+import requests
+from algosdk import constants
+from algosdk.error import AlgodHTTPError, IndexerHTTPError
+from algosdk.future.transaction import SuggestedParams
+from algosdk.v2client.algod import AlgodClient, api_version_path_prefix
+from algosdk.v2client.indexer import IndexerClient
+
+from a_constants import ROUND_TIME
+from Misc import http_session
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        return response.json()["message"]
+    except (ValueError, KeyError, TypeError):
+        return response.text
+
+
+class SessionAlgodClient(AlgodClient):
+    """an AlgodClient whose requests reuse a keep-alive session owned by the calling thread"""
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        header = {"User-Agent": "py-algorand-sdk"}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth:
+            header[constants.algod_auth_header] = self.algod_token
+        if requrl not in constants.unversioned_paths:
+            requrl = api_version_path_prefix + requrl
+        response = http_session().request(method, self.algod_address + requrl, params=params, data=data, headers=header)
+        if response.status_code >= 400:
+            raise AlgodHTTPError(_error_message(response), response.status_code)
+        if response_format == "json":
+            return response.json()
+        return response.content
+
+
+class SessionIndexerClient(IndexerClient):
+    """an IndexerClient whose requests reuse a keep-alive session owned by the calling thread"""
+    def indexer_request(self, method, requrl, params=None, data=None, headers=None):
+        header = {"User-Agent": "py-algorand-sdk"}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth and self.indexer_token:
+            header[constants.indexer_auth_header] = self.indexer_token
+        if requrl not in constants.unversioned_paths:
+            requrl = api_version_path_prefix + requrl
+        response = http_session().request(method, self.indexer_address + requrl, params=params, data=data, headers=header)
+        if response.status_code >= 400:
+            raise IndexerHTTPError(_error_message(response))
+        return response.json()
+
+
+class aClientPool:
+    def __init__(self, algod_url: str, indexer_url: str, params_ttl: float = 60 * ROUND_TIME):
+        self.algod_client = SessionAlgodClient("", algod_url.rstrip("/"))
+        self.indexer_client = SessionIndexerClient("", indexer_url.rstrip("/"))
+        self.params_ttl = params_ttl
+        self._params = None
+        self._params_at = 0
+        self._lock = threading.Lock()
+
+    def params(self, fee: int = None) -> SuggestedParams:
+        """a private copy of the suggested params, so callers can change it without affecting other threads.
+        the node is asked at most once per params_ttl, fee sets a flat fee on the copy"""
+        with self._lock:
+            if self._params is None or time.monotonic() - self._params_at >= self.params_ttl:
+                self._params = self.algod_client.suggested_params()
+                self._params_at = time.monotonic()
+            params = copy.copy(self._params)
+        if fee is not None:
+            params.flat_fee = True
+            params.fee = fee
+        return params
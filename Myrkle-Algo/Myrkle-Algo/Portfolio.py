@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Iterable
+
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client.algod import AlgodClient
+
+from Cache import named_cache
+from Misc import get_token_prices
+
+
+class aPortfolio(AlgodClient):
+    def __init__(self, algod_url: str, workers: int = 16):
+        self.algod_client = AlgodClient("", algod_url)
+        self.workers = workers
+
+    def asset_decimals(self, asset_id: int) -> int:
+        """return the decimals of an asset, cached since they never change"""
+        cache = named_cache("asset_decimals", maxsize=65536)
+        decimals = cache.get((self.algod_client.algod_address, asset_id))
+        if decimals is None:
+            try:
+                decimals = self.algod_client.asset_info(asset_id)["params"].get("decimals", 0)
+            except AlgodHTTPError:
+                # destroyed assets can still be held, they are valued as whole units at price 0
+                return 0
+            cache.set((self.algod_client.algod_address, asset_id), decimals)
+        return decimals
+
+    def value_wallets(self, wallet_addrs: Iterable[str]) -> dict:
+        """value many wallets in USD, the asset set is deduped across all wallets so
+        params and prices are fetched once per unique asset. amounts and values are Decimals.
+        a wallet whose account or one of whose assets could not be read is left out and listed in failed with the error"""
+        addresses = list(dict.fromkeys(wallet_addrs))
+        accounts = {}
+        failed = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {address: executor.submit(self.algod_client.account_info, address) for address in addresses}
+            for address, future in futures.items():
+                try:
+                    accounts[address] = future.result()
+                except (AlgodHTTPError, OSError) as e: # OSError covers URLError and timeouts
+                    failed[address] = str(e)
+            asset_ids = sorted({holding["asset-id"] for info in accounts.values() for holding in info.get("assets", [])})
+            decimal_futures = {asset_id: executor.submit(self.asset_decimals, asset_id) for asset_id in asset_ids}
+            decimals = {}
+            unreadable = {}
+            for asset_id, future in decimal_futures.items():
+                try:
+                    decimals[asset_id] = future.result()
+                except OSError as e:
+                    unreadable[asset_id] = str(e)
+        decimals[0] = 6
+        for address, info in list(accounts.items()):
+            errors = [f"asset {holding['asset-id']}: {unreadable[holding['asset-id']]}"
+                for holding in info.get("assets", []) if holding["asset-id"] in unreadable]
+            if errors:
+                # valuing the rest would understate the wallet
+                failed[address] = "; ".join(errors)
+                del accounts[address]
+        prices = get_token_prices([0] + asset_ids, self.workers)
+
+        wallets = {}
+        totals = {}
+        for address, info in accounts.items():
+            holdings = [{"asset-id": 0, "amount": info["amount"]}] + info.get("assets", [])
+            wallet = {"value": Decimal(0), "assets": []}
+            for holding in holdings:
+                asset_id = holding["asset-id"]
+                amount = Decimal(holding["amount"]).scaleb(-decimals[asset_id])
+                price = Decimal(str(prices.get(asset_id, 0)))
+                value = amount * price
+                wallet["assets"].append({"id": asset_id, "amount": amount, "price": price, "value": value})
+                wallet["value"] += value
+                total = totals.setdefault(asset_id, {"id": asset_id, "amount": Decimal(0), "price": price, "value": Decimal(0)})
+                total["amount"] += amount
+                total["value"] += value
+            wallets[address] = wallet
+
+        return {
+            "wallets": wallets,
+            "assets": list(totals.values()),
+            "value": sum((wallet["value"] for wallet in wallets.values()), Decimal(0)),
+            "failed": failed}
@@ -1,26 +1,53 @@
-from algosdk.future.transaction import AssetTransferTxn, PaymentTxn
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, NamedTuple, Union
+
+import requests
+from algosdk.future.transaction import AssetTransferTxn, PaymentTxn, Transaction
 from algosdk.util import microalgos_to_algos
 from algosdk.v2client.algod import AlgodClient
 from algosdk.v2client.indexer import IndexerClient
 
-from Misc import find_amount_w_decimal, timestamp_to_string
+from Fees import MIN_FEE, TXN_SIZE, aFeeEstimator
+from Misc import RawRow, algod_get, find_amount_w_decimal, history_filters
+from Pool import aClientPool
+from Wire import account_view
+
+
+class Balance(NamedTuple):
+    address: str
+    microalgos: int
+    min_balance: int
+    error: str = ""
 
 
 class aWallet(AlgodClient, IndexerClient):
     def __init__(self, algod_url: str, indexer_url: str, fee: int,
-    explorer_account_url: str, explorer_asset_url: str, explorer_tx_url: str):
-        self.algod_client = AlgodClient("", algod_url)
-        self.indexer_client = IndexerClient("", indexer_url)
-        self.params = self.algod_client.suggested_params()
-        self.params.flat_fee = True
-        self.params.fee = fee
+    explorer_account_url: str, explorer_asset_url: str, explorer_tx_url: str,
+    fee_estimator: Union[aFeeEstimator, None] = None, pool: Union[aClientPool, None] = None):
+        if pool is not None:
+            # shared clients and cached params, the urls are taken from the pool
+            self.algod_client = pool.algod_client
+            self.indexer_client = pool.indexer_client
+            self.params = pool.params(fee)
+        else:
+            self.algod_client = AlgodClient("", algod_url)
+            self.indexer_client = IndexerClient("", indexer_url)
+            self.params = self.algod_client.suggested_params()
+            self.params.flat_fee = True
+            self.params.fee = fee
         self.explorer_account_url = explorer_account_url
         self.explorer_asset_url = explorer_asset_url
         self.explorer_tx_url = explorer_tx_url
+        self.fee_estimator = fee_estimator
         
-    def get_network_fee(self) -> str:
-        """return the network fee"""
-        return str(microalgos_to_algos(self.algod_client.suggested_params().fee))
+    def get_network_fee(self, target_rounds: int = 1) -> str:
+        """return the flat fee of a typical transaction, from the fee estimator without a network call when one is set.
+        without one, algod's per byte fee is scaled to TXN_SIZE and floored at the minimum fee, as the estimator does"""
+        if self.fee_estimator is not None:
+            return str(microalgos_to_algos(self.fee_estimator.fee(target_rounds)))
+        params = self.algod_client.suggested_params()
+        return str(microalgos_to_algos(max(params.fee * TXN_SIZE, params.min_fee or MIN_FEE)))
 
     def show_account_in_explorer(self, wallet_address: str) -> str:
         """generate a link to view account in explorer"""
@@ -37,13 +64,15 @@ class aWallet(AlgodClient, IndexerClient):
         msg = f"{self.explorer_asset_url}{asset_id}"
         return msg
 
-    def send_algo(self, sender_addr: str, receiver: str, amount: int, note: str) -> dict:
-        """generate algo payment object, for multiple or single transfers"""
-        return dict(PaymentTxn(sender_addr, self.params, receiver, amount, note=note).dictify())
+    def send_algo(self, sender_addr: str, receiver: str, amount: int, note: str, as_txn: bool = False) -> Union[dict, Transaction]:
+        """generate algo payment object, for multiple or single transfers, as_txn returns the unsigned transaction"""
+        txn = PaymentTxn(sender_addr, self.params, receiver, amount, note=note)
+        return txn if as_txn else dict(txn.dictify())
 
-    def send_asset(self, sender_addr: str, receiver: str, amount: int, asset_id: int, note: str) -> dict:
-        """generate asset transfer object"""
-        return dict(AssetTransferTxn(sender_addr, self.params, receiver, amount, asset_id, note=note).dictify())
+    def send_asset(self, sender_addr: str, receiver: str, amount: int, asset_id: int, note: str, as_txn: bool = False) -> Union[dict, Transaction]:
+        """generate asset transfer object, as_txn returns the unsigned transaction"""
+        txn = AssetTransferTxn(sender_addr, self.params, receiver, amount, asset_id, note=note)
+        return txn if as_txn else dict(txn.dictify())
 
     def algo_balance(self, wallet_addr: str) -> dict:
         """returns algo balance"""
@@ -61,20 +90,54 @@ class aWallet(AlgodClient, IndexerClient):
             "asset_count": asset_count,
             "spend_balance": spend_balance}
     
+    def algo_balances(self, wallet_addrs: Iterable[str], workers: int = 32,
+        stats: Union[dict, None] = None) -> Iterator[Balance]:
+        """stream Balance records for many addresses as each lookup finishes, with at most workers
+        requests in flight over reused connections. failed lookups are yielded with error set,
+        and stats, if given, is filled with count, failed, seconds and per_second once the stream ends"""
+        start = time.perf_counter()
+        count = 0
+        failed = 0
+        addresses = iter(wallet_addrs)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            while True:
+                for wallet_addr in addresses:
+                    pending.add(executor.submit(self._balance, wallet_addr))
+                    if len(pending) >= workers * 2:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    balance = future.result()
+                    count += 1
+                    failed += bool(balance.error)
+                    yield balance
+        if stats is not None:
+            seconds = time.perf_counter() - start
+            stats.update({"count": count, "failed": failed, "seconds": seconds,
+                "per_second": count / seconds if seconds else 0})
+
+    def _balance(self, wallet_addr: str) -> Balance:
+        try:
+            info = algod_get(self.algod_client, f"/accounts/{wallet_addr}", {"exclude": "all"})
+            return Balance(wallet_addr, info["amount"], info["min-balance"])
+        except (requests.RequestException, ValueError, KeyError) as e:
+            return Balance(wallet_addr, 0, 0, str(e) or type(e).__name__)
+    
     def account_tokens(self, wallet_addr: str) -> list:
         """tokens an account can send and receive """
         account_tokens = []
-        query = self.algod_client.account_info(wallet_addr)
-        assets = query["assets"]
-        for account_token in assets:
+        for holding in account_view(self.algod_client, wallet_addr).holdings:
             token = {}
             token["token"] = ""
             token["unit"] = ""
             token["decimal"] = 0
-            token['amount'] = int(account_token['amount'])
-            token["id"] = account_token["asset-id"]
-            token["is_frozen"] = account_token["is-frozen"]
-            req = self.algod_client.asset_info(account_token["asset-id"])
+            token['amount'] = holding.amount
+            token["id"] = holding.asset_id
+            token["is_frozen"] = holding.is_frozen
+            req = self.algod_client.asset_info(holding.asset_id)
             if "params" in req:
                 info = req["params"]
                 if "name" in info:
@@ -83,7 +146,7 @@ class aWallet(AlgodClient, IndexerClient):
                     token["token"] = info["unit-name"]
                     if 'decimals' in info != 0:
                         token['decimal'] = info['decimals']
-                        token['amount'] = find_amount_w_decimal(account_token['amount'], info['decimals'])
+                        token['amount'] = find_amount_w_decimal(holding.amount, info['decimals'])
             account_tokens.append(token)
         account_tokens = filter(lambda i: i["decimal"] != 0, account_tokens) # do_it(account_tokens)
             # format list and drop zero decimals
@@ -92,17 +155,15 @@ class aWallet(AlgodClient, IndexerClient):
     def account_nfts(self, wallet_addr: str) -> list:
         """return account nfts"""
         account_tokens = []
-        query = self.algod_client.account_info(wallet_addr)
-        assets = query["assets"]
-        for account_token in assets:
+        for holding in account_view(self.algod_client, wallet_addr).holdings:
             token = {}
             token["nft"] = ""
             token["unit"] = ""
             token["decimal"] = 0
-            token["amount"] = int(account_token['amount'])
-            token["id"] = account_token["asset-id"]
-            token["is_frozen"] = account_token["is-frozen"]
-            req = self.algod_client.asset_info(account_token["asset-id"])
+            token["amount"] = holding.amount
+            token["id"] = holding.asset_id
+            token["is_frozen"] = holding.is_frozen
+            req = self.algod_client.asset_info(holding.asset_id)
             if "params" in req:
                 info = req["params"]
                 if "name" in info:
@@ -115,24 +176,28 @@ class aWallet(AlgodClient, IndexerClient):
         account_tokens = filter(lambda i: i["decimal"] == 0, account_tokens)# format list and drop 0 + x decimals
         return list(account_tokens)
     
-    def algo_transactions(self, wallet_addr: str, limit: int = None) -> dict:
-        """algo transactions carried out by an account"""
+    def algo_transactions(self, wallet_addr: str, limit: int = None, raw: bool = False, **filters) -> dict:
+        """algo transactions carried out by an account
+        raw=True returns RawRow rows of integers that format lazily through fmt
+        filters run on the indexer: address_role ("sender"/"receiver"), min_round, max_round,
+        start_time, end_time, note_prefix and min_amount (amounts greater than it, in microalgos)"""
         transactions_dict = {}
         sent = []
         received = []
-        response = self.indexer_client.search_transactions_by_address(address=wallet_addr, limit=limit, txn_type="pay")
+        response = self.indexer_client.search_transactions(address=wallet_addr, limit=limit, txn_type="pay", **history_filters(filters))
         if "transactions" in response:
             transactions = response["transactions"]
             for transaction in transactions:
-                transact = {}
+                transact = RawRow(explorer_tx_url=self.explorer_tx_url)
                 transact["sender"] = transaction["sender"]
                 transact["receiver"] = transaction["payment-transaction"]["receiver"]
-                transact["amount"] = str(microalgos_to_algos(transaction["payment-transaction"]["amount"]))
-                transact["fee"] = str(microalgos_to_algos(transaction["fee"]))
-                transact["timestamp"] = timestamp_to_string(transaction["round-time"])
+                transact["amount"] = transaction["payment-transaction"]["amount"]
+                transact["fee"] = transaction["fee"]
+                transact["round_time"] = transaction["round-time"]
                 transact["tx_type"] = transaction["tx-type"]
                 transact["txid"] = transaction["id"]
-                transact["link"] = f"{self.explorer_tx_url}{transaction['id']}"
+                if not raw:
+                    transact = self._formatted_row(transact)
                 if transact['sender'] == wallet_addr:
                     sent.append(transact)
                 elif transact['sender'] != wallet_addr:
@@ -141,76 +206,48 @@ class aWallet(AlgodClient, IndexerClient):
             transactions_dict['received'] =  received
         return transactions_dict
 
-    def asset_transactions(self, wallet_addr: str, limit: int = None) -> dict:
-        """all asset transfer transactions carried out by an account"""
-        transactions_dict = {}
-        sent = []
-        received = []
-        response = self.indexer_client.search_transactions_by_address(address=wallet_addr, limit=limit, txn_type="axfer")
-        if "transactions" in response:
-            transactions = response["transactions"]
-            for transaction in transactions:
-                transact = {}
-                transact["asset"] = ""
-                transact["unit"] = ""
-                transact["decimal"] = 0
-                transact["amount"] = int(transaction["asset-transfer-transaction"]["amount"])
-                info = self.algod_client.asset_info(transaction["asset-transfer-transaction"]["asset-id"])
-                if "params" in info:
-                    if "name" in info["params"]:
-                        transact["asset"] = info["params"]["name"]
-                    if "unit-name" in info["params"]:
-                        transact["unit"] = info["params"]["unit-name"]
-                    if "decimals" in info["params"] != 0:
-                        transact['decimal'] = info["params"]['decimals']
-                        transact['amount'] = find_amount_w_decimal(transaction["asset-transfer-transaction"]["amount"], info["params"]["decimals"])
-                transact["sender"] = transaction["sender"]
-                transact["receiver"] = transaction["asset-transfer-transaction"]["receiver"]
-                transact["fee"] = str(microalgos_to_algos(transaction["fee"]))
-                transact["timestamp"] = timestamp_to_string(transaction["round-time"])
-                transact["tx_type"] = transaction["tx-type"]
-                transact["txid"] = transaction["id"]
-                transact["link"] = f"{self.explorer_tx_url}{transaction['id']}"
+    def asset_transactions(self, wallet_addr: str, limit: int = None, raw: bool = False, **filters) -> dict:
+        """all asset transfer transactions carried out by an account
+        raw=True returns RawRow rows of integers that format lazily through fmt
+        filters run on the indexer, see algo_transactions, except min_amount: without an asset the indexer
+        compares it to microalgo amounts, which asset transfers do not have, use asset_transaction for it"""
+        if "min_amount" in filters:
+            raise TypeError("min_amount needs an asset, use asset_transaction")
+        response = self.indexer_client.search_transactions(address=wallet_addr, limit=limit, txn_type="axfer", **history_filters(filters))
+        return self._asset_transfer_rows(response, wallet_addr, raw)
 
-                if transact['sender'] == wallet_addr:
-                    sent.append(transact)
-                elif transact['sender'] != wallet_addr:
-                    received.append(transact)
-            transactions_dict['sent'] = sent
-            transactions_dict['received'] =  received
-        return transactions_dict
+    def asset_transaction(self, wallet_addr: str, asset_id: int, raw: bool = False, **filters) -> dict:
+        """all asset transfer transactions for an asset id by an account
+        raw=True returns RawRow rows of integers that format lazily through fmt
+        filters run on the indexer, see algo_transactions, min_amount is in the asset's base units"""
+        response = self.indexer_client.search_asset_transactions(address=wallet_addr, asset_id=asset_id, txn_type="axfer", **history_filters(filters))
+        return self._asset_transfer_rows(response, wallet_addr, raw)
 
-    def asset_transaction(self, wallet_addr: str, asset_id: int) -> dict:
-        """all asset transfer transactions for an asset id by an account"""
+    def _asset_transfer_rows(self, response: dict, wallet_addr: str, raw: bool) -> dict:
         transactions_dict = {}
         sent = []
         received = []
-        response = self.indexer_client.search_asset_transactions(address=wallet_addr, asset_id=asset_id, txn_type="axfer")
+        asset_params = {}
         if "transactions" in response:
             transactions = response["transactions"]
             for transaction in transactions:
-                transact = {}
-                transact["asset"] = ""
-                transact["unit"] = ""
-                transact["decimal"] = 0
-                transact["amount"] = int(transaction["asset-transfer-transaction"]["amount"])
-                info = self.algod_client.asset_info(transaction["asset-transfer-transaction"]["asset-id"])
-                if "params" in info:
-                    if "name" in info["params"]:
-                        transact["asset"] = info["params"]["name"]
-                    if "unit-name" in info["params"]:
-                        transact["unit"] = info["params"]["unit-name"]
-                    if "decimals" in info["params"] != 0:
-                        transact['decimal'] = info["params"]['decimals']
-                        transact['amount'] = find_amount_w_decimal(transaction["asset-transfer-transaction"]["amount"], info["params"]["decimals"])
+                asset_id = transaction["asset-transfer-transaction"]["asset-id"]
+                if asset_id not in asset_params:
+                    asset_params[asset_id] = self.algod_client.asset_info(asset_id).get("params", {})
+                params = asset_params[asset_id]
+                transact = RawRow(explorer_tx_url=self.explorer_tx_url)
+                transact["asset"] = params.get("name", "")
+                transact["unit"] = params.get("unit-name", "")
+                transact["decimal"] = params.get("decimals", 0)
+                transact["amount"] = transaction["asset-transfer-transaction"]["amount"]
                 transact["sender"] = transaction["sender"]
                 transact["receiver"] = transaction["asset-transfer-transaction"]["receiver"]
-                transact["fee"] = str(microalgos_to_algos(transaction["fee"]))
-                transact["timestamp"] = timestamp_to_string(transaction["round-time"])
+                transact["fee"] = transaction["fee"]
+                transact["round_time"] = transaction["round-time"]
                 transact["tx_type"] = transaction["tx-type"]
                 transact["txid"] = transaction["id"]
-                transact["link"] = f"{self.explorer_tx_url}{transaction['id']}"
-
+                if not raw:
+                    transact = self._formatted_row(transact)
                 if transact['sender'] == wallet_addr:
                     sent.append(transact)
                 elif transact['sender'] != wallet_addr:
@@ -219,6 +256,16 @@ class aWallet(AlgodClient, IndexerClient):
             transactions_dict['received'] =  received
         return transactions_dict
 
+    def _formatted_row(self, row: RawRow) -> dict:
+        formatted = {}
+        for key in row:
+            if key == "round_time":
+                formatted["timestamp"] = row.fmt("timestamp")
+            else:
+                formatted[key] = row.fmt(key)
+        formatted["link"] = row.fmt("link")
+        return formatted
+
 
 
 
@@ -0,0 +1,187 @@
+import threading
+from typing import Iterable, Iterator
+
+from algosdk.error import IndexerHTTPError
+from algosdk.v2client.indexer import IndexerClient
+
+from a_constants import ROUND_TIME
+from Cache import named_cache
+from Misc import (ASSET_TTL, cover_assets, indexer_key, lookup_asset,
+                  uncover_assets)
+
+WATCHED_TYPES = ("acfg", "afrz")
+WATCHED_TTL = 24 * 60 * 60 # seconds, a safety net in case polling stops without stop() being called
+
+
+def iter_round_transactions(client: IndexerClient, txn_type: str, min_round: int, max_round: int,
+    page_size: int = 1000, asset_id: int = None) -> Iterator[dict]:
+    """yield every transaction of txn_type confirmed between two rounds inclusive, inner transactions included.
+    asset_id limits it to one asset"""
+    next_page = None
+    while True:
+        req = client.search_transactions(txn_type=txn_type, min_round=min_round, max_round=max_round,
+            limit=page_size, next_page=next_page, asset_id=asset_id)
+        txns = req.get("transactions", [])
+        for txn in txns:
+            yield from _flatten(txn, txn.get("confirmed-round"))
+        next_page = req.get("next-token")
+        if not txns or not next_page:
+            break
+
+def _flatten(txn: dict, confirmed_round: int) -> Iterator[dict]:
+    # an application call can configure or freeze assets through inner transactions
+    yield {**txn, "confirmed-round": confirmed_round}
+    for inner in txn.get("inner-txns", []):
+        yield from _flatten(inner, confirmed_round)
+
+def asset_event(txn: dict) -> dict:
+    """the asset change a config, freeze, opt-in or close-out transaction makes, None for anything else"""
+    if txn.get("tx-type") == "acfg":
+        asset_id = txn["asset-config-transaction"].get("asset-id", 0)
+        if not asset_id:
+            return None # a creation, nothing can be cached for an asset that did not exist
+        return {"round": txn["confirmed-round"], "type": "acfg", "asset_id": asset_id,
+            "sender": txn["sender"], "address": "", "frozen": None}
+    if txn.get("tx-type") == "afrz":
+        freeze = txn["asset-freeze-transaction"]
+        return {"round": txn["confirmed-round"], "type": "afrz", "asset_id": freeze["asset-id"],
+            "sender": txn["sender"], "address": freeze["address"], "frozen": freeze["new-freeze-status"]}
+    if txn.get("tx-type") == "axfer":
+        transfer = txn["asset-transfer-transaction"]
+        if transfer.get("close-to"):
+            opted_in = False
+        elif transfer["receiver"] == txn["sender"] and not transfer.get("amount") and "sender" not in transfer:
+            opted_in = True
+        else:
+            return None # a plain transfer or clawback leaves the frozen flag alone
+        # opting in or out resets the account's frozen flag
+        return {"round": txn["confirmed-round"], "type": "axfer", "asset_id": transfer["asset-id"],
+            "sender": txn["sender"], "address": txn["sender"], "frozen": None, "opted_in": opted_in}
+    return None
+
+
+class aWatcher(IndexerClient):
+    def __init__(self, indexer_url: str, asset_ids: Iterable[int] = (), accounts: Iterable[str] = (),
+        holder_indexes: Iterable = (), cache_ttl: float = WATCHED_TTL, interval: float = ROUND_TIME):
+        """watch new rounds for config and freeze changes to asset_ids, or made by or to accounts.
+        while the watcher runs, watched assets are cached for cache_ttl and the Misc role and frozen helpers
+        read them from cache, holder_indexes are Holders.aHolderIndex instances to keep current.
+        entries are keyed by the indexer url, with or without a trailing slash"""
+        self.indexer_client = IndexerClient("", indexer_url)
+        self.asset_ids = frozenset(asset_ids)
+        self.accounts = frozenset(accounts)
+        self.holder_indexes = list(holder_indexes)
+        self.cache_ttl = cache_ttl
+        self.interval = interval
+        self.round = self.indexer_client.health()["round"]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watches(self, event: dict) -> bool:
+        return (event["asset_id"] in self.asset_ids or event["sender"] in self.accounts
+            or event["address"] in self.accounts)
+
+    def poll(self) -> list:
+        """scan the rounds confirmed since the last poll and apply every watched change, returns the changes.
+        one paged query per transaction type, plus a transfer query per watched asset for opt-ins and close-outs"""
+        current_round = self.indexer_client.health()["round"]
+        if current_round <= self.round:
+            return []
+        events = []
+        for txn_type in WATCHED_TYPES:
+            for txn in iter_round_transactions(self.indexer_client, txn_type, self.round + 1, current_round):
+                event = asset_event(txn)
+                if event is not None and self.watches(event):
+                    events.append(event)
+        for asset_id in self.asset_ids:
+            for txn in iter_round_transactions(self.indexer_client, "axfer", self.round + 1, current_round, asset_id=asset_id):
+                event = asset_event(txn)
+                if event is not None:
+                    events.append(event)
+        events.sort(key=lambda event: event["round"])
+        for event in events:
+            self.apply(event)
+        # only move on once every change is applied, a failed poll rescans the same rounds
+        self.round = current_round
+        return events
+
+    def apply(self, event: dict) -> bool:
+        """push one change into the caches: refetch a watched asset's config, drop any other,
+        set the new frozen flag for the frozen account and drop it for an account that opted in or out"""
+        if event["type"] == "acfg":
+            if event["asset_id"] in self.asset_ids:
+                self._refresh_asset(event["asset_id"])
+            else:
+                self._asset_cache().delete((indexer_key(self.indexer_client), event["asset_id"]))
+            return True
+        frozen_cache = self._frozen_cache()
+        key = (indexer_key(self.indexer_client), event["asset_id"], event["address"])
+        if event["type"] == "axfer":
+            frozen_cache.delete(key)
+            default_frozen = None
+            for index in self.holder_indexes:
+                if index.asset_id == event["asset_id"]:
+                    if event["opted_in"] and default_frozen is None:
+                        default_frozen = lookup_asset(self.indexer_client, event["asset_id"])["asset"]["params"].get("default-frozen", False)
+                    index.set_opted_in(event["address"], event["opted_in"], bool(default_frozen))
+            return True
+        frozen_cache.set(key, event["frozen"])
+        for index in self.holder_indexes:
+            if index.asset_id == event["asset_id"]:
+                index.set_frozen(event["address"], event["frozen"])
+        return True
+
+    def warm(self) -> int:
+        """cache every watched asset for cache_ttl, returns how many were cached"""
+        return sum(self._refresh_asset(asset_id) for asset_id in self.asset_ids)
+
+    def start(self) -> bool:
+        """warm the watched assets and poll from a background thread, once per interval"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self.warm()
+        cover_assets(self.indexer_client.indexer_address, self.asset_ids)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> bool:
+        """stop polling and drop the entries of watched assets no other running watcher covers,
+        the helpers fetch those fresh again"""
+        if self._thread is None:
+            return False
+        self._stop.set()
+        self._thread.join() # a poll in flight would cache the assets again
+        self._thread = None
+        asset_cache = self._asset_cache()
+        frozen_cache = self._frozen_cache()
+        for asset_id in uncover_assets(self.indexer_client.indexer_address, self.asset_ids):
+            asset_cache.delete((indexer_key(self.indexer_client), asset_id))
+            # frozen flags are keyed by account too, every account's flag for the asset goes
+            frozen_cache.delete_prefix((indexer_key(self.indexer_client), asset_id))
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                pass # the indexer is unreachable, the next poll covers the missed rounds
+            self._stop.wait(self.interval)
+
+    def _refresh_asset(self, asset_id: int) -> bool:
+        cache = self._asset_cache()
+        key = (indexer_key(self.indexer_client), asset_id)
+        try:
+            cache.set(key, self.indexer_client.asset_info(asset_id), self.cache_ttl)
+        except IndexerHTTPError:
+            cache.delete(key)
+            return False
+        return True
+
+    def _asset_cache(self):
+        return named_cache("asset_info", ttl=ASSET_TTL, maxsize=65536)
+
+    def _frozen_cache(self):
+        return named_cache("asset_frozen", ttl=ASSET_TTL, maxsize=65536)
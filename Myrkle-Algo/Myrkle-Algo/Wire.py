@@ -0,0 +1,52 @@
+import json
+from typing import NamedTuple, Union
+
+import msgpack
+from algosdk.v2client.algod import AlgodClient
+
+from Misc import algod_get
+
+
+class Holding(NamedTuple):
+    asset_id: int
+    amount: int
+    is_frozen: bool
+
+
+class AccountView(NamedTuple):
+    address: str
+    amount: int
+    holdings: tuple
+
+
+def decode_account(data: Union[bytes, memoryview], address: str = "") -> AccountView:
+    """decode an algod msgpack account, keeping the balance and the asset holdings.
+    algod sends msgpack accounts as its codec tagged AccountData, not the json shape: the balance is "algo",
+    holdings are "asset", a map of asset id to {"a": amount, "f": frozen}, and there is no address, min balance or round.
+    every other section (app local state, created assets and apps) is skipped without being decoded.
+    msgpack leaves out zero values, so missing fields read as 0 or False"""
+    # asset ids are integer map keys
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+    unpacker.feed(data)
+    amount = 0
+    holdings = ()
+    for _ in range(unpacker.read_map_header()):
+        key = unpacker.unpack()
+        if key == "algo":
+            amount = unpacker.unpack()
+        elif key == "asset":
+            holdings = tuple(sorted(Holding(asset_id, holding.get("a", 0), holding.get("f", False))
+                for asset_id, holding in unpacker.unpack().items()))
+        else:
+            unpacker.skip()
+    return AccountView(address, amount, holdings)
+
+def decode_account_json(data: Union[bytes, str]) -> AccountView:
+    """the same view from an algod json account, what the json path costs for comparison"""
+    account = json.loads(data)
+    return AccountView(account.get("address", ""), account.get("amount", 0), tuple(sorted(
+        Holding(asset["asset-id"], asset.get("amount", 0), asset.get("is-frozen", False)) for asset in account.get("assets", []))))
+
+def account_view(client: AlgodClient, wallet_addr: str) -> AccountView:
+    """an account's balance and holdings, requested from algod as msgpack"""
+    return decode_account(algod_get(client, f"/accounts/{wallet_addr}", response_format="msgpack"), wallet_addr)
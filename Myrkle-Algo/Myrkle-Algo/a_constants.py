@@ -15,4 +15,8 @@ URLS_= {
 "TESTNET_ACCOUNT": "https://testnet.algoexplorer.io/address/",
 }
 
-ZERO_ADDRESS = "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAY5HFKQ"
\ No newline at end of file
+ZERO_ADDRESS = "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAY5HFKQ"
+
+ROUND_TIME = 2.8 # seconds, roughly how long one round lasts
+ASSET_MIN_BALANCE = 100000 # microalgos an account must keep for every asset it holds
+MAX_GROUP_SIZE = 16 # transactions in one atomic group
\ No newline at end of file
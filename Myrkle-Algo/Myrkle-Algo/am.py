@@ -1,8 +1,218 @@
+import argparse
+import base64
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import msgpack
+from algosdk import encoding
 from algosdk.v2client.algod import AlgodClient
 from algosdk.v2client.indexer import IndexerClient
 
-algod_address = "https://node.testnet.algoexplorerapi.io"
-algod_token = ""
+from a_constants import URLS_, ZERO_ADDRESS
+
+DEFAULT_ASSET = 31566704 # USDC on mainnet
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99 of latency samples in milliseconds"""
+    if len(samples) < 2:
+        value = round(samples[0] * 1000, 1) if samples else None
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": round(cuts[49] * 1000, 1), "p95": round(cuts[94] * 1000, 1), "p99": round(cuts[98] * 1000, 1)}
+
+def time_call(call: Callable, samples: int) -> dict:
+    """call samples times in a row, returns the latency percentiles and error count"""
+    latencies = []
+    errors = 0
+    for _ in range(samples):
+        start = time.perf_counter()
+        try:
+            call()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+    return {**percentiles(latencies), "errors": errors}
+
+def throughput(call: Callable, requests: int, concurrency: int) -> dict:
+    """successful requests per second when requests calls are spread over concurrency threads,
+    with the success and error counts, so a node refusing every request shows 0 rather than its refusal rate"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda _: _succeeded(call), range(requests)))
+    seconds = time.perf_counter() - start
+    successes = sum(outcomes)
+    return {"per_second": round(successes / seconds, 1) if seconds else 0, "successes": successes,
+        "errors": requests - successes}
+
+def _succeeded(call: Callable) -> bool:
+    try:
+        call()
+        return True
+    except Exception:
+        return False
+
+def probe_algod(url: str, address: str, asset_id: int, samples: int, concurrency: int) -> dict:
+    """latency, throughput and current round of an algod node"""
+    client = AlgodClient("", url.rstrip("/"))
+    calls = {
+        "status": client.status,
+        "account_info": lambda: client.account_info(address),
+        "asset_info": lambda: client.asset_info(asset_id)}
+    result = {"url": url, "kind": "algod", "calls": {name: time_call(call, samples) for name, call in calls.items()}}
+    result["throughput"] = throughput(client.status, samples * concurrency, concurrency)
+    try:
+        result["round"] = client.status()["last-round"]
+    except Exception:
+        result["round"] = None
+    return result
+
+def probe_indexer(url: str, address: str, asset_id: int, samples: int, concurrency: int) -> dict:
+    """latency, throughput and current round of an indexer"""
+    client = IndexerClient("", url.rstrip("/"))
+    calls = {
+        "status": client.health,
+        "account_info": lambda: client.account_info(address),
+        "asset_info": lambda: client.asset_info(asset_id),
+        "search_transactions": lambda: client.search_transactions(limit=10)}
+    result = {"url": url, "kind": "indexer", "calls": {name: time_call(call, samples) for name, call in calls.items()}}
+    result["throughput"] = throughput(client.health, samples * concurrency, concurrency)
+    try:
+        result["round"] = client.health()["round"]
+    except Exception:
+        result["round"] = None
+    return result
+
+def probe(algod_urls: list, indexer_urls: list, address: str = ZERO_ADDRESS, asset_id: int = DEFAULT_ASSET,
+    samples: int = 20, concurrency: int = 8) -> list:
+    """probe every node, then report each node's round lag behind the most advanced one"""
+    results = [probe_algod(url, address, asset_id, samples, concurrency) for url in algod_urls]
+    results += [probe_indexer(url, address, asset_id, samples, concurrency) for url in indexer_urls]
+    rounds = [result["round"] for result in results if result["round"] is not None]
+    for result in results:
+        result["round_lag"] = max(rounds) - result["round"] if rounds and result["round"] is not None else None
+    return results
+
+def _omit_empty(value):
+    # algod's codec leaves out zero and empty fields, like algosdk does for transactions.
+    # only named fields are left out, an asset or app map keeps an entry even when it is empty
+    if isinstance(value, dict):
+        value = {key: _omit_empty(item) for key, item in value.items()}
+        return {key: item for key, item in value.items() if not isinstance(key, str) or item not in (None, 0, False, "", b"", {})}
+    return value
+
+def _address_bytes(addr: str) -> bytes:
+    return encoding.decode_address(addr) if addr else b""
+
+def account_data(account: dict) -> dict:
+    """a json algod account in the codec tagged AccountData shape algod sends for format=msgpack"""
+    return _omit_empty({
+        "onl": {"Offline": 0, "Online": 1, "NotParticipating": 2}.get(account.get("status"), 0),
+        "algo": account.get("amount", 0),
+        "ebase": account.get("reward-base", 0),
+        "ern": account.get("rewards", 0),
+        "asset": {asset["asset-id"]: {"a": asset.get("amount", 0), "f": asset.get("is-frozen", False)}
+            for asset in account.get("assets", [])},
+        "apar": {created["index"]: {
+            "t": params.get("total", 0), "dc": params.get("decimals", 0), "df": params.get("default-frozen", False),
+            "un": params.get("unit-name", ""), "an": params.get("name", ""), "au": params.get("url", ""),
+            "m": _address_bytes(params.get("manager", "")), "r": _address_bytes(params.get("reserve", "")),
+            "f": _address_bytes(params.get("freeze", "")), "c": _address_bytes(params.get("clawback", ""))}
+            for created in account.get("created-assets", []) for params in [created["params"]]},
+        "appl": {app["id"]: {
+            "hsch": {"nui": app.get("schema", {}).get("num-uint", 0), "nbs": app.get("schema", {}).get("num-byte-slice", 0)},
+            "tkv": {base64.b64decode(pair["key"]): {"tt": pair["value"]["type"], "tb": base64.b64decode(pair["value"].get("bytes", "")),
+                "ui": pair["value"].get("uint", 0)} for pair in app.get("key-value", [])}}
+            for app in account.get("apps-local-state", [])}})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """a local stand-in for algod and indexer, answering the probed endpoints with fixed bodies"""
+    protocol_version = "HTTP/1.1" # keep-alive, like a real node behind a proxy
+    disable_nagle_algorithm = True # headers and body are written separately, nagle would stall kept-alive requests
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        started = getattr(self.server, "started", time.time())
+        current_round = 1000 + int((time.time() - started) / 2.8)
+        if path in ("/v2/status", "/health"):
+            body = {"last-round": current_round, "round": current_round}
+        elif path.startswith("/v2/accounts/"):
+            body = {"address": path.rsplit("/", 1)[-1], "amount": 1000000, "round": current_round, "account": {},
+                "assets": [{"asset-id": DEFAULT_ASSET, "amount": 2500000, "is-frozen": False}]}
+        elif path.startswith("/v2/assets/"):
+            body = {"index": int(path.rsplit("/", 1)[-1]), "params": {"decimals": 6}, "asset": {}}
+        elif path == "/v2/transactions":
+            body = {"transactions": [], "current-round": current_round}
+        elif path == "/v2/transactions/params":
+            body = {"fee": 0, "min-fee": 1000, "last-round": current_round, "genesis-id": "stub-v1",
+                "genesis-hash": "SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=", "consensus-version": "stub"}
+        else:
+            self.send_error(404)
+            return
+        content_type = "application/json"
+        payload = json.dumps(body).encode()
+        if "format=msgpack" in self.path:
+            # algod answers msgpack account requests with the raw AccountData, not the json shape
+            content_type = "application/msgpack"
+            payload = msgpack.packb(account_data(body) if path.startswith("/v2/accounts/") else body, use_bin_type=True)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def serve_stub(port: int = 0) -> ThreadingHTTPServer:
+    """start the stand-in server on localhost in a daemon thread, port 0 picks a free port"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.started = time.time()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def print_report(results: list):
+    for result in results:
+        throughput = result["throughput"]
+        print(f"{result['kind']:8} {result['url']}  round={result['round']} lag={result['round_lag']} "
+            f"throughput={throughput['per_second']} req/s ({throughput['successes']} ok, {throughput['errors']} errors)")
+        for name, stats in result["calls"].items():
+            print(f"    {name:20} p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms errors={stats['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="probe algod and indexer nodes for latency, throughput and round lag")
+    parser.add_argument("--network", choices=["mainnet", "testnet", "all"], default="all",
+        help="which a_constants.URLS_ nodes to probe when no urls are given")
+    parser.add_argument("--algod", action="append", default=[], help="algod url to probe, repeatable")
+    parser.add_argument("--indexer", action="append", default=[], help="indexer url to probe, repeatable")
+    parser.add_argument("--stub", action="store_true", help="probe a local stand-in server instead of real nodes")
+    parser.add_argument("--address", default=ZERO_ADDRESS)
+    parser.add_argument("--asset", type=int, default=DEFAULT_ASSET)
+    parser.add_argument("--samples", type=int, default=20, help="calls per endpoint for the latency percentiles")
+    parser.add_argument("--concurrency", type=int, default=8, help="threads for the throughput check")
+    parser.add_argument("--json", action="store_true", help="print the raw results as json")
+    args = parser.parse_args()
+
+    # round lag only makes sense between nodes of the same network, so each network is probed as its own group
+    groups = [(args.algod, args.indexer)]
+    if args.stub:
+        stub_url = f"http://127.0.0.1:{serve_stub().server_address[1]}"
+        groups = [([stub_url], [stub_url])]
+    elif not args.algod and not args.indexer:
+        networks = ["MAINNET", "TESTNET"] if args.network == "all" else [args.network.upper()]
+        groups = [([URLS_[f"MINT_ENGINE_ALGOD_{network}_URL"]], [URLS_[f"MINT_ENGINE_INDEXER_{network}_URL"]]) for network in networks]
 
-algod_client = AlgodClient(algod_token, algod_address)
-print(algod_client.status())
\ No newline at end of file
+    results = []
+    for algod_urls, indexer_urls in groups:
+        results += probe(algod_urls, indexer_urls, args.address, args.asset, args.samples, args.concurrency)
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print_report(results)
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import msgpack
+from a_constants import ZERO_ADDRESS
+from am import account_data, serve_stub
+from Cache import SharedCache, TTLCache
+from Eng import aEng
+from Misc import meta_hash_directory, meta_hash_file_data
+from Pool import aClientPool
+from Wire import decode_account, decode_account_json
+
+
+def bench_meta_hash(directory: str, pattern: str = "*", workers: int = None) -> dict:
+    """hash a folder of media files one by one and across a process pool, return the throughput in MB/s"""
+    filenames = sorted(str(path) for path in Path(directory).glob(pattern) if path.is_file())
+    total_bytes = sum(os.path.getsize(filename) for filename in filenames)
+    megabytes = total_bytes / (1 << 20)
+
+    start = time.perf_counter()
+    for filename in filenames:
+        meta_hash_file_data(filename)
+    serial_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    meta_hash_directory(directory, pattern, workers=workers)
+    pool_seconds = time.perf_counter() - start
+
+    return {
+        "files": len(filenames),
+        "megabytes": round(megabytes, 2),
+        "serial_mb_s": round(megabytes / serial_seconds, 2) if serial_seconds else 0,
+        "pool_mb_s": round(megabytes / pool_seconds, 2) if pool_seconds else 0}
+
+def bench_pool(algod_url: str = None, indexer_url: str = None, requests: int = 500, threads: tuple = (1, 8, 32)) -> dict:
+    """requests per second of a per request aEng (own clients and suggested_params) against one built from a
+    shared aClientPool, each request reads one account. without urls a local stand-in node is used"""
+    if algod_url is None:
+        algod_url = indexer_url = f"http://127.0.0.1:{serve_stub().server_address[1]}"
+    pool = aClientPool(algod_url, indexer_url)
+
+    def per_request(_):
+        aEng(algod_url, indexer_url, "", 1000).algod_client.account_info(ZERO_ADDRESS)
+
+    def pooled(_):
+        aEng(algod_url, indexer_url, "", 1000, pool=pool).algod_client.account_info(ZERO_ADDRESS)
+
+    results = {}
+    for thread_count in threads:
+        for name, task in (("per_request", per_request), ("pooled", pooled)):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=thread_count) as executor:
+                list(executor.map(task, range(requests)))
+            results[f"{name}_{thread_count}"] = round(requests / (time.perf_counter() - start), 1)
+    return results
+
+def _asset_response(asset_id: int) -> dict:
+    # roughly the size and shape of an indexer asset_info response
+    return {"asset": {"index": asset_id, "created-at-round": 20000000 + asset_id, "deleted": False, "params": {
+        "creator": ZERO_ADDRESS, "manager": ZERO_ADDRESS, "reserve": ZERO_ADDRESS, "freeze": "", "clawback": "",
+        "decimals": 6, "default-frozen": False, "name": f"Asset {asset_id}", "unit-name": "UNIT", "total": 10 ** 15,
+        "url": "https://example.com"}}, "current-round": 25000000}
+
+def _hit_latency(cache, keys: int) -> dict:
+    for asset_id in range(keys):
+        cache.set(("indexer", asset_id), _asset_response(asset_id))
+    latencies = []
+    for asset_id in range(keys):
+        start = time.perf_counter()
+        cache.get(("indexer", asset_id))
+        latencies.append(time.perf_counter() - start)
+    return {"p50_us": round(statistics.median(latencies) * 1e6, 1), "mean_us": round(statistics.mean(latencies) * 1e6, 1)}
+
+def _worker_fills(cache_path: str, keys: int) -> int:
+    # one worker process looking up every key, returns how many lookups it had to fetch itself
+    cache = SharedCache(cache_path, "asset_info") if cache_path else TTLCache(maxsize=keys)
+    fills = 0
+    def fill(asset_id):
+        nonlocal fills
+        fills += 1
+        time.sleep(0.0005) # a stand-in for the network round trip a miss costs
+        return _asset_response(asset_id)
+    for asset_id in range(keys):
+        cache.get_or_set(("indexer", asset_id), lambda: fill(asset_id))
+    return fills
+
+def bench_cache(path: str = None, keys: int = 2000, processes: int = 8) -> dict:
+    """hit latency of the in-process TTLCache against the SQLite SharedCache, and how many lookups
+    processes workers fetch themselves when each has its own cache or when they share one"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = path or os.path.join(directory, "cache.sqlite")
+        results = {
+            "in_process_hit": _hit_latency(TTLCache(maxsize=keys), keys),
+            "shared_hit": _hit_latency(SharedCache(path, "hit_latency", maxsize=keys), keys)}
+        for name, cache_path in (("in_process_fills", None), ("shared_fills", path)):
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results[name] = sum(executor.map(_worker_fills, [cache_path] * processes, [keys] * processes))
+        results["lookups"] = keys * processes
+    return results
+
+def _synthetic_account(holdings: int, apps: int = 50, created: int = 1000) -> dict:
+    # an algod json account response with many holdings, opted in apps and created assets
+    return {"address": ZERO_ADDRESS, "amount": 10 ** 9, "min-balance": 100000 * (holdings + 1), "round": 25000000,
+        "status": "Offline", "reward-base": 12345, "total-assets-opted-in": holdings,
+        "assets": [{"asset-id": 10 ** 8 + index, "amount": index * 1000003, "is-frozen": index % 97 == 0}
+            for index in range(holdings)],
+        "apps-local-state": [{"id": index, "schema": {"num-uint": 4, "num-byte-slice": 4},
+            "key-value": [{"key": "a2V5", "value": {"type": 1, "bytes": "dmFsdWU=" * 4}}] * 8} for index in range(apps)],
+        "created-assets": [{"index": index, "params": {"creator": ZERO_ADDRESS, "manager": ZERO_ADDRESS,
+            "reserve": ZERO_ADDRESS, "total": 10 ** 15, "decimals": 6, "name": "Asset", "unit-name": "UNIT",
+            "url": "https://example.com"}} for index in range(created)]}
+
+def bench_wire(holdings: tuple = (100, 1000, 10000), repeats: int = 20) -> dict:
+    """bytes on the wire and milliseconds to parse an account into an AccountView, json against msgpack"""
+    results = {}
+    for count in holdings:
+        account = _synthetic_account(count)
+        json_bytes = json.dumps(account).encode()
+        # the same account as algod encodes it for format=msgpack
+        msgpack_bytes = msgpack.packb(account_data(account), use_bin_type=True)
+        assert decode_account(msgpack_bytes, ZERO_ADDRESS) == decode_account_json(json_bytes)
+        timings = {}
+        for name, decode, data in (("json", decode_account_json, json_bytes), ("msgpack", lambda data: decode_account(data, ZERO_ADDRESS), msgpack_bytes)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                decode(data)
+            timings[name] = round((time.perf_counter() - start) / repeats * 1000, 2)
+        results[count] = {"json_bytes": len(json_bytes), "msgpack_bytes": len(msgpack_bytes),
+            "json_ms": timings["json"], "msgpack_ms": timings["msgpack"]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Myrkle-Algo benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    hash_parser = commands.add_parser("hash", help="metadata hashing throughput for a folder of files")
+    hash_parser.add_argument("directory")
+    hash_parser.add_argument("--pattern", default="*")
+    hash_parser.add_argument("--workers", type=int, default=None)
+
+    pool_parser = commands.add_parser("pool", help="shared client pool throughput at 1, 8 and 32 threads")
+    pool_parser.add_argument("--algod", default=None, help="algod url, a local stand-in node when omitted")
+    pool_parser.add_argument("--indexer", default=None)
+    pool_parser.add_argument("--requests", type=int, default=500)
+
+    cache_parser = commands.add_parser("cache", help="in-process against shared cache hit latency and cross-process fills")
+    cache_parser.add_argument("--path", default=None, help="sqlite file for the shared cache, a temporary one when omitted")
+    cache_parser.add_argument("--keys", type=int, default=2000)
+    cache_parser.add_argument("--processes", type=int, default=8)
+
+    wire_parser = commands.add_parser("wire", help="json against msgpack account bytes and parse time")
+    wire_parser.add_argument("--holdings", type=int, nargs="+", default=[100, 1000, 10000])
+    wire_parser.add_argument("--repeats", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "hash":
+        print(bench_meta_hash(args.directory, args.pattern, args.workers))
+    elif args.command == "pool":
+        print(bench_pool(args.algod, args.indexer or args.algod, args.requests))
+    elif args.command == "cache":
+        print(bench_cache(args.path, args.keys, args.processes))
+    elif args.command == "wire":
+        print(bench_wire(tuple(args.holdings), args.repeats))